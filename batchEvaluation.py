@@ -0,0 +1,142 @@
+"""
+Evaluation of many positions at once with NumPy, for bulk analysis and evaluation tuning. The positions are an (N, 64)
+array of piece codes (GameState.squares stacked), and scoreBoards gives exactly the scores smartMoveFinder.scoreBoard
+gives them one at a time. fenArrays builds the array straight from FENs, for tuning sets. Run from the project directory to compare the two:
+    python batchEvaluation.py [--positions 20000] [--seed 0]
+"""
+import argparse
+import random
+import time
+
+import numpy as np
+
+from chessEngine import GameState, WHITE, BLACK, KING, EMPTY, pieceCodes, pieceSquareScores
+from smartMoveFinder import scoreBoard, isEndgame, CHECKMATE, STALEMATE
+
+# pieceSquareScores as one [piece code, square] array, zero for the codes that are not pieces
+pieceSquareTable = np.zeros((len(pieceSquareScores), 64), dtype=np.int32)
+for code, scores in enumerate(pieceSquareScores):
+    if scores is not None:
+        pieceSquareTable[code] = scores
+squareNumbers = np.arange(64)
+# piece code of every FEN placement character, as a table indexed by its byte; "." stands for an empty square
+fenCodes = np.full(256, 255, dtype=np.uint8)
+fenCodes[ord(".")] = EMPTY
+for name, code in pieceCodes.items():
+    if code != EMPTY:
+        fenCodes[ord(name[1].upper() if name[0] == "w" else name[1].lower())] = code
+emptyRuns = str.maketrans({str(n): "." * n for n in range(1, 9)} | {"/": None})
+edgeDistances = np.array([min(square >> 3, 7 - (square >> 3), square & 7, 7 - (square & 7)) for square in range(64)])
+
+
+def scoreBoards(squares, whiteToMove, checkmate=None, stalemate=None):
+    '''
+    scoreBoard of every row of squares, an (N, 64) array of piece codes, as an array of N floats: positive when white is
+    winning. whiteToMove, checkmate and stalemate are N booleans each; the last two need move generation, which is not
+    vectorized, so they are taken as all False when left out
+    '''
+    squares = np.asarray(squares)
+    whiteToMove = np.asarray(whiteToMove, dtype=bool)
+    # material and piece positions, summed in centipawns like GameState.pieceSquareScore
+    score = pieceSquareTable[squares, squareNumbers].sum(axis=1) / 100
+    whitePieces = ((squares & WHITE) != 0).sum(axis=1)
+    blackPieces = ((squares & BLACK) != 0).sum(axis=1)
+    endgame = (whitePieces <= 7) | (blackPieces <= 7) | (whitePieces + blackPieces <= 14)
+    # endgame terms, added in the same order as scoreBoard so the floats come out the same
+    kingSquares = np.argmax(squares == np.where(whiteToMove, WHITE | KING, BLACK | KING)[:, None], axis=1)
+    score = np.where(endgame, score + edgeDistances[kingSquares] * 0.1, score)
+    score = np.where(whitePieces <= 7, score - 50, score)
+    score = np.where(blackPieces <= 7, score + 50, score)
+    if stalemate is not None:
+        score = np.where(stalemate, STALEMATE, score)
+    if checkmate is not None:
+        score = np.where(checkmate, np.where(whiteToMove, -CHECKMATE, CHECKMATE), score)
+    return score
+
+
+def positionArrays(gameStates):
+    '''
+    the (squares, whiteToMove, checkmate, stalemate) arguments of scoreBoards for a list of GameStates. Their checkmate
+    and stalemate flags are only set by getValidMoves
+    '''
+    squares = np.array([gs.squares for gs in gameStates], dtype=np.uint8)
+    whiteToMove = np.array([gs.whiteToMove for gs in gameStates], dtype=bool)
+    checkmate = np.array([gs.checkmate for gs in gameStates], dtype=bool)
+    stalemate = np.array([gs.stalemate for gs in gameStates], dtype=bool)
+    return squares, whiteToMove, checkmate, stalemate
+
+
+def fenArrays(fens):
+    '''
+    the (squares, whiteToMove) arguments of scoreBoards read straight from a list of FENs, without setting up
+    GameStates. Only the placement and side to move are looked at, and they are not checked for legality; checkmate and
+    stalemate need move generation, so they are left to the caller
+    '''
+    fields = [fen.split() for fen in fens]
+    placements = [field[0].translate(emptyRuns) if field else "" for field in fields]
+    if any(len(placement) != 64 for placement in placements):
+        raise ValueError("a FEN placement does not have 64 squares")
+    squares = fenCodes[np.frombuffer("".join(placements).encode(), dtype=np.uint8)].reshape(len(fens), 64)
+    if (squares == 255).any():
+        raise ValueError("unknown piece letter in a FEN placement")
+    whiteToMove = np.array([len(field) < 2 or field[1] == "w" for field in fields], dtype=bool)
+    return squares, whiteToMove
+
+
+def randomPositions(count, seed):
+    '''
+    FENs of the positions of random games, restarted from the start position when one ends or reaches 200 plies,
+    so there are openings, middlegames and endgames
+    '''
+    rng = random.Random(seed)
+    fens = []
+    gs = GameState()
+    while len(fens) < count:
+        fens.append(gs.getFen())
+        validMoves = gs.getValidMoves()
+        if not validMoves or len(gs.moveLog) >= 200:
+            gs = GameState()
+        else:
+            gs.makeMove(rng.choice(validMoves))
+    return fens
+
+
+def main():
+    parser = argparse.ArgumentParser(description="throughput of scoreBoards against scoreBoard, checking they agree")
+    parser.add_argument("--positions", type=int, default=20000)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+    fens = randomPositions(args.positions, args.seed)
+    # scoreBoard reads the score GameState keeps up to date while moves are made, so on its own it is cheap; positions
+    # that come from elsewhere (a tuning set) first have to be set up, so from FENs the fair comparison is GameState and
+    # scoreBoard against fenArrays and scoreBoards. Neither of those looks for checkmate or stalemate
+    start = time.perf_counter()
+    gameStates = [GameState(fen) for fen in fens]
+    setupTime = time.perf_counter() - start
+    start = time.perf_counter()
+    fenScores = scoreBoards(*fenArrays(fens))
+    fenTime = time.perf_counter() - start
+    setupScores = np.array([scoreBoard(gs) for gs in gameStates])
+    for gs in gameStates:
+        gs.getValidMoves() # sets checkmate and stalemate
+    start = time.perf_counter()
+    scalarScores = [scoreBoard(gs) for gs in gameStates]
+    scalarTime = time.perf_counter() - start
+    start = time.perf_counter()
+    arrays = positionArrays(gameStates)
+    conversionTime = time.perf_counter() - start
+    start = time.perf_counter()
+    batchScores = scoreBoards(*arrays)
+    batchTime = time.perf_counter() - start
+    mismatches = int((batchScores != np.array(scalarScores)).sum()) + int((fenScores != setupScores).sum())
+    print("%d positions, %d in the endgame, %d mismatches" % (len(gameStates), sum(isEndgame(gs)[2] for gs in gameStates), mismatches))
+    print("%-24s %10s %14s" % ("", "seconds", "positions/s"))
+    print("%-24s %10.3f %14.0f" % ("GameState + scoreBoard", setupTime + scalarTime, len(gameStates) / (setupTime + scalarTime)))
+    print("%-24s %10.3f %14.0f %6.1fx" % ("fenArrays + scoreBoards", fenTime, len(gameStates) / fenTime, (setupTime + scalarTime) / fenTime))
+    print("%-24s %10.3f %14.0f" % ("scoreBoard", scalarTime, len(gameStates) / scalarTime))
+    print("%-24s %10.3f %14.0f %6.1fx" % ("scoreBoards", batchTime, len(gameStates) / batchTime, scalarTime / batchTime))
+    print("%-24s %10.3f %14.0f %6.1fx" % ("with positionArrays", batchTime + conversionTime, len(gameStates) / (batchTime + conversionTime), scalarTime / (batchTime + conversionTime)))
+
+
+if __name__ == "__main__":
+    main()
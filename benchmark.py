@@ -0,0 +1,181 @@
+"""
+Benchmarks for the search. Run from the project directory:
+    python benchmark.py ordering [--depth 4]    nodes searched at a fixed depth with and without move ordering
+    python benchmark.py parallel [--depth 4] [--workers 1 2 4 8]    speedup of findBestMoveParallel against the worker count
+    python benchmark.py stats [--depth 4] [--profile]    SearchStats of every position as JSON
+    python benchmark.py search [--depth 5]    nodes searched at a fixed depth with each of the selective search features off
+"""
+import argparse
+import json
+import os
+import queue
+import random
+import time
+
+from chessEngine import GameState
+import smartMoveFinder
+from searchStats import SearchStats
+
+# positions given as the moves played from the start position, in the notation of Move.getChessNotation
+benchmarkPositions = {
+    "start": [],
+    "italian": "e2e4 e7e5 g1f3 b8c6 f1c4 g8f6".split(),
+    "queens gambit": "d2d4 d7d5 c2c4 e7e6 b1c3 g8f6 c1g5 f8e7 e2e3 e8g8 g1f3 b8d7".split(),
+    "open center": "e2e4 e7e5 g1f3 b8c6 d2d4 e5d4 f3d4 g8f6 d4c6 b7c6 e4e5 d8e7 d1e2 f6d5".split(),
+}
+
+
+def playMoves(notations):
+    gs = GameState()
+    for notation in notations:
+        move = gs.getMoveFromNotation(notation)
+        if move is None:
+            raise ValueError("illegal move " + notation)
+        gs.makeMove(move)
+    return gs
+
+
+def searchFixedDepth(gs, depth):
+    '''
+    searches from a cold start (empty transposition table and ordering tables, same root order every run)
+    and returns (nodes, seconds)
+    '''
+    smartMoveFinder.newGame()
+    random.seed(0)
+    start = time.time()
+    smartMoveFinder.findBestMove(gs, gs.getValidMoves(), queue.Queue(), maxDepth=depth, timeLimit=None, useBook=False)
+    return smartMoveFinder.searcher.nodeCount, time.time() - start
+
+
+def benchmarkOrdering(depth):
+    print("depth %d" % depth)
+    print("%-15s %12s %12s %10s %9s %9s" % ("position", "unordered", "ordered", "reduction", "t unord", "t ord"))
+    totalUnordered = totalOrdered = 0
+    for name, notations in benchmarkPositions.items():
+        gs = playMoves(notations)
+        smartMoveFinder.searcher.moveOrdering = False
+        unorderedNodes, unorderedTime = searchFixedDepth(gs, depth)
+        smartMoveFinder.searcher.moveOrdering = True
+        orderedNodes, orderedTime = searchFixedDepth(gs, depth)
+        totalUnordered += unorderedNodes
+        totalOrdered += orderedNodes
+        print("%-15s %12d %12d %9.1f%% %8.2fs %8.2fs" % (name, unorderedNodes, orderedNodes, 100 * (1 - orderedNodes / unorderedNodes), unorderedTime, orderedTime))
+    print("%-15s %12d %12d %9.1f%%" % ("total", totalUnordered, totalOrdered, 100 * (1 - totalOrdered / totalUnordered)))
+
+
+searchFeatures = ("nullMovePruning", "lateMoveReductions", "principalVariationSearch", "aspirationWindows") # Searcher switches
+
+
+def benchmarkSearch(depth):
+    '''
+    total nodes and time over the benchmark positions with every feature of searchFeatures on, then with each one off
+    and with all of them off. The best move and score of each position are printed where they differ from all on
+    '''
+    print("depth %d" % depth)
+    print("%-36s %12s %9s %9s" % ("", "nodes", "vs all", "seconds"))
+    baseline = None
+    for off in (None,) + searchFeatures + ("all",):
+        for feature in searchFeatures:
+            setattr(smartMoveFinder.searcher, feature, off != feature and off != "all")
+        totalNodes = totalTime = 0
+        results = {}
+        for name, notations in benchmarkPositions.items():
+            gs = playMoves(notations)
+            info = []
+            smartMoveFinder.newGame()
+            random.seed(0)
+            start = time.time()
+            smartMoveFinder.findBestMove(gs, gs.getValidMoves(), queue.Queue(), maxDepth=depth, timeLimit=None, useBook=False,
+                                         infoCallback=lambda depth, score, bestMove: info.append((bestMove.getChessNotation(), round(score, 2))))
+            totalTime += time.time() - start
+            totalNodes += smartMoveFinder.searcher.nodeCount
+            results[name] = info[-1]
+        if baseline is None:
+            baseline = (totalNodes, results)
+        label = "all on" if off is None else "all off" if off == "all" else "without " + off
+        print("%-36s %12d %8.1f%% %9.2f" % (label, totalNodes, 100 * totalNodes / baseline[0], totalTime))
+        for name, result in results.items():
+            if result != baseline[1][name]:
+                print("    %s: %s %+.2f instead of %s %+.2f" % ((name,) + result + baseline[1][name]))
+    for feature in searchFeatures:
+        setattr(smartMoveFinder.searcher, feature, True)
+
+
+def searchParallel(gs, depth, workers):
+    '''
+    like searchFixedDepth with findBestMoveParallel, the worker processes are started fresh (cold transposition
+    tables) before the clock starts. Returns (nodes, seconds)
+    '''
+    smartMoveFinder.newGame()
+    smartMoveFinder.closeSearchPool()
+    if workers > 1:
+        smartMoveFinder.getSearchPool(workers)
+    random.seed(0)
+    start = time.time()
+    smartMoveFinder.findBestMoveParallel(gs, gs.getValidMoves(), queue.Queue(), workers=workers, maxDepth=depth, timeLimit=None, useBook=False)
+    return smartMoveFinder.searcher.nodeCount, time.time() - start
+
+
+def benchmarkParallel(depth, workerCounts):
+    print("depth %d, %d cores" % (depth, os.cpu_count()))
+    print("%-8s %12s %10s %12s %8s" % ("workers", "nodes", "seconds", "nodes/s", "speedup"))
+    baseline = None
+    for workers in workerCounts:
+        totalNodes = totalTime = 0
+        for name, notations in benchmarkPositions.items():
+            nodes, seconds = searchParallel(playMoves(notations), depth, workers)
+            totalNodes += nodes
+            totalTime += seconds
+        if baseline is None:
+            baseline = totalTime
+        print("%-8d %12d %10.2f %12.0f %7.2fx" % (workers, totalNodes, totalTime, totalNodes / totalTime, baseline / totalTime))
+    smartMoveFinder.closeSearchPool()
+
+
+def benchmarkStats(depth, profile):
+    '''
+    searches every position as searchFixedDepth does and prints their SearchStats as one JSON object, with the profile
+    reports after it when profiling
+    '''
+    results = {}
+    reports = []
+    for name, notations in benchmarkPositions.items():
+        gs = playMoves(notations)
+        stats = SearchStats(profile)
+        smartMoveFinder.newGame()
+        random.seed(0)
+        smartMoveFinder.findBestMove(gs, gs.getValidMoves(), queue.Queue(), maxDepth=depth, timeLimit=None, useBook=False, stats=stats)
+        results[name] = stats.toDict()
+        if profile:
+            reports.append("%s\n%s" % (name, stats.profileSummary()))
+    print(json.dumps(results, indent=2))
+    for report in reports:
+        print(report)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="search benchmarks")
+    commands = parser.add_subparsers(dest="command", required=True)
+    ordering = commands.add_parser("ordering", help="node counts at a fixed depth with and without move ordering")
+    ordering.add_argument("--depth", type=int, default=smartMoveFinder.DEPTH)
+    parallel = commands.add_parser("parallel", help="time to a fixed depth for a number of search workers")
+    parallel.add_argument("--depth", type=int, default=smartMoveFinder.DEPTH)
+    parallel.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8, 16], help="worker counts to compare, the first is the baseline")
+    search = commands.add_parser("search", help="nodes at a fixed depth with each selective search feature switched off")
+    search.add_argument("--depth", type=int, default=5)
+    stats = commands.add_parser("stats", help="search statistics (nodes, cutoffs, transposition table, times) as JSON")
+    stats.add_argument("--depth", type=int, default=smartMoveFinder.DEPTH)
+    stats.add_argument("--profile", action="store_true", help="run cProfile around each search and print its report")
+    args = parser.parse_args()
+    if args.command == "ordering":
+        benchmarkOrdering(args.depth)
+    elif args.command == "parallel":
+        benchmarkParallel(args.depth, args.workers)
+    elif args.command == "search":
+        benchmarkSearch(args.depth)
+    elif args.command == "stats":
+        benchmarkStats(args.depth, args.profile)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,276 @@
+"""
+Endgame bitbases for king + pawn, king + rook and king + queen against a lone king (KPK, KRK, KQK): one bit per
+position, set when the side with the extra piece wins. They are generated by retrograde analysis, working back from
+the checkmates, and stored in assets/ as packed bits. The search looks positions up with probe in O(1).
+    python bitbases.py generate       rebuild assets/kpk.bin, krk.bin, kqk.bin
+    python bitbases.py verify [N]     check N random positions of every bitbase against GameState.getValidMoves
+"""
+import argparse
+import os
+import random
+import sys
+from collections import deque
+
+from chessEngine import GameState, EMPTY, PAWN, ROOK, QUEEN, KING, WHITE, TYPE_MASK
+from chessEngine import rays, kingTargets, pawnAttackers, slidingDirections
+
+BITBASE_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets")
+ENDINGS = {PAWN: "kpk", ROOK: "krk", QUEEN: "kqk"}
+SIZE = 2 * 64 * 64 * 64 # side to move, strong king, weak king, piece square
+
+# probe results, for the side to move
+DRAW = 0
+WIN = 1
+LOSS = -1
+
+
+# Positions are stored with the strong side (the one with the extra piece) as white, a position where black has the
+# piece is looked up with the board flipped vertically. Index: strong side to move, strong king, weak king, piece square
+def positionIndex(strongToMove, strongKing, weakKing, pieceSquare):
+    return ((strongToMove * 64 + strongKing) * 64 + weakKing) * 64 + pieceSquare
+
+
+def pieceAttacks(pieceType, pieceSquare, target, blocker):
+    '''
+    does the strong side's piece attack target? The strong king on blocker is the only thing that can block it
+    (the weak king is either on target or moving away from its square)
+    '''
+    if pieceType == PAWN:
+        return pieceSquare in pawnAttackers[WHITE][target]
+    for d in slidingDirections[pieceType]:
+        for square in rays[pieceSquare][d]:
+            if square == target:
+                return True
+            if square == blocker:
+                break
+    return False
+
+
+def isValid(pieceType, strongToMove, strongKing, weakKing, pieceSquare):
+    if strongKing == weakKing or pieceSquare == strongKing or pieceSquare == weakKing or weakKing in kingTargets[strongKing]:
+        return False
+    if pieceType == PAWN and not 8 <= pieceSquare < 56: # pawns can't be on the first or last rank
+        return False
+    # with the strong side to move the weak king can't be in check
+    return not (strongToMove and pieceAttacks(pieceType, pieceSquare, weakKing, strongKing))
+
+
+def weakKingMoves(pieceType, strongKing, weakKing, pieceSquare):
+    '''
+    squares the weak king can legally move to; one of them can be pieceSquare (capturing the piece, a draw)
+    '''
+    return [square for square in kingTargets[weakKing] if square != strongKing and square not in kingTargets[strongKing]
+            and (square == pieceSquare or not pieceAttacks(pieceType, pieceSquare, square, strongKing))]
+
+
+def generate(pieceType, promotionBitbases=None):
+    '''
+    retrograde analysis: the weak side to move is lost once every one of its moves leads to a won position (or it is
+    checkmated), the strong side to move wins once one of its moves leads to a lost position. Starting from the mates,
+    every lost position makes the positions that can move into it won, and every won position takes one move off the
+    count of the positions that can move into it. Returns a bytearray with one byte (1 = strong side wins) per index.
+    promotionBitbases {ROOK: bits, QUEEN: bits} lets KPK positions win by promoting
+    '''
+    won = bytearray(SIZE)
+    movesLeft = bytearray(SIZE // 2) # weak side to move: legal moves not yet known to lose
+    queue = deque()
+    for strongKing in range(64):
+        for weakKing in range(64):
+            for pieceSquare in range(64):
+                if not isValid(pieceType, 0, strongKing, weakKing, pieceSquare):
+                    continue
+                index = positionIndex(0, strongKing, weakKing, pieceSquare)
+                movesLeft[index] = len(weakKingMoves(pieceType, strongKing, weakKing, pieceSquare))
+                if movesLeft[index] == 0 and pieceAttacks(pieceType, pieceSquare, weakKing, strongKing): # checkmate
+                    won[index] = 1
+                    queue.append(index)
+    if pieceType == PAWN:
+        # a pawn on the 7th rank that promotes into a lost position for the weak side wins
+        for strongKing in range(64):
+            for weakKing in range(64):
+                for pieceSquare in range(8, 16):
+                    if isValid(PAWN, 1, strongKing, weakKing, pieceSquare) and pieceSquare - 8 not in (strongKing, weakKing):
+                        promotionIndex = positionIndex(0, strongKing, weakKing, pieceSquare - 8)
+                        if any(bits[promotionIndex] for bits in promotionBitbases.values()):
+                            index = positionIndex(1, strongKing, weakKing, pieceSquare)
+                            won[index] = 1
+                            queue.append(index)
+
+    while queue:
+        index = queue.popleft()
+        strongToMove, rest = divmod(index, 64 * 64 * 64)
+        strongKing, rest = divmod(rest, 64 * 64)
+        weakKing, pieceSquare = divmod(rest, 64)
+        if not strongToMove:
+            # lost for the weak side: every strong side move that leads here wins. Un-make those moves
+            predecessors = [(square, pieceSquare) for square in kingTargets[strongKing] if square != weakKing and square != pieceSquare]
+            if pieceType == PAWN:
+                if pieceSquare + 8 < 56 and pieceSquare + 8 not in (strongKing, weakKing):
+                    predecessors.append((strongKing, pieceSquare + 8))
+                    if pieceSquare >> 3 == 4 and pieceSquare + 16 not in (strongKing, weakKing): # double push from the 2nd rank
+                        predecessors.append((strongKing, pieceSquare + 16))
+            else:
+                for d in slidingDirections[pieceType]:
+                    for square in rays[pieceSquare][d]:
+                        if square == strongKing or square == weakKing:
+                            break
+                        predecessors.append((strongKing, square))
+            for fromKing, fromSquare in predecessors:
+                if isValid(pieceType, 1, fromKing, weakKing, fromSquare):
+                    predecessor = positionIndex(1, fromKing, weakKing, fromSquare)
+                    if not won[predecessor]:
+                        won[predecessor] = 1
+                        queue.append(predecessor)
+        else:
+            # won for the strong side: one more move of the weak side leading here loses. Un-make weak king moves
+            for square in kingTargets[weakKing]:
+                if square != strongKing and square != pieceSquare and isValid(pieceType, 0, strongKing, square, pieceSquare):
+                    predecessor = positionIndex(0, strongKing, square, pieceSquare)
+                    if not won[predecessor]:
+                        movesLeft[predecessor] -= 1
+                        if movesLeft[predecessor] == 0:
+                            won[predecessor] = 1
+                            queue.append(predecessor)
+    return won
+
+
+def packBits(won):
+    packed = bytearray(SIZE // 8)
+    for index in range(SIZE):
+        if won[index]:
+            packed[index >> 3] |= 1 << (index & 7)
+    return packed
+
+
+def bitbasePath(pieceType):
+    return os.path.join(BITBASE_DIR, ENDINGS[pieceType] + ".bin")
+
+
+def loadBitbases():
+    # {piece type: packed bits}, endings without a file are left out
+    loaded = {}
+    for pieceType in ENDINGS:
+        if os.path.exists(bitbasePath(pieceType)):
+            with open(bitbasePath(pieceType), "rb") as bitbaseFile:
+                loaded[pieceType] = bitbaseFile.read()
+    return loaded
+
+
+bitbases = loadBitbases()
+
+
+def normalize(gs):
+    '''
+    (piece type, strong side to move, strong king, weak king, piece square) of a position with a king and one other piece
+    against a king, the board flipped when the strong side is black; None for any other material
+    '''
+    if gs.whitePieceCount + gs.blackPieceCount != 3:
+        return None
+    for pieceSquare, piece in enumerate(gs.squares):
+        if piece != EMPTY and piece & TYPE_MASK != KING:
+            break
+    if piece & WHITE:
+        return piece & TYPE_MASK, 1 if gs.whiteToMove else 0, gs.whiteKingSquare, gs.blackKingSquare, pieceSquare
+    # flip the board so the strong side plays up the board like white
+    return piece & TYPE_MASK, 0 if gs.whiteToMove else 1, gs.blackKingSquare ^ 56, gs.whiteKingSquare ^ 56, pieceSquare ^ 56
+
+
+def probe(gs):
+    '''
+    WIN, LOSS or DRAW for the side to move if the position is king and pawn, rook or queen against king (or two kings),
+    None for anything else. Only the piece counts are checked unless there are 3 pieces or less
+    '''
+    if gs.whitePieceCount + gs.blackPieceCount > 3:
+        return None
+    if gs.whitePieceCount + gs.blackPieceCount == 2:
+        return DRAW
+    pieceType, strongToMove, strongKing, weakKing, pieceSquare = normalize(gs)
+    bits = bitbases.get(pieceType)
+    if bits is None:
+        return None
+    index = positionIndex(strongToMove, strongKing, weakKing, pieceSquare)
+    if not bits[index >> 3] >> (index & 7) & 1:
+        return DRAW
+    return WIN if strongToMove else LOSS
+
+
+def generateAll():
+    generated = {}
+    for pieceType in (ROOK, QUEEN, PAWN): # KPK needs KRK and KQK for its promotions
+        won = generate(pieceType, generated if pieceType == PAWN else None)
+        generated[pieceType] = won
+        with open(bitbasePath(pieceType), "wb") as bitbaseFile:
+            bitbaseFile.write(packBits(won))
+        counts = [0, 0, 0, 0] # valid and won positions, strong side to move and weak side to move
+        for strongKing in range(64):
+            for weakKing in range(64):
+                for pieceSquare in range(64):
+                    for strongToMove in (1, 0):
+                        if isValid(pieceType, strongToMove, strongKing, weakKing, pieceSquare):
+                            counts[2 * (1 - strongToMove)] += 1
+                            counts[2 * (1 - strongToMove) + 1] += won[positionIndex(strongToMove, strongKing, weakKing, pieceSquare)]
+        print("%s: strong side to move %d of %d won, weak side to move %d of %d lost" % (ENDINGS[pieceType].upper(), counts[1], counts[0], counts[3], counts[2]))
+
+
+def verify(samples):
+    '''
+    every sampled position must agree with its successors, found with GameState move generation: won for the side to move
+    if one move leads to a position lost for the opponent, lost if every move leads to a won one (or it is checkmated)
+    '''
+    global bitbases
+    bitbases = loadBitbases()
+    names = {PAWN: "P", ROOK: "R", QUEEN: "Q"}
+    errors = 0
+    for pieceType in ENDINGS:
+        for sample in range(samples):
+            while True:
+                strongToMove, strongKing, weakKing, pieceSquare = random.randrange(2), random.randrange(64), random.randrange(64), random.randrange(64)
+                if isValid(pieceType, strongToMove, strongKing, weakKing, pieceSquare):
+                    break
+            # strong side as black half of the time, to check the flipped lookup too
+            strongIsWhite = random.randrange(2) == 0
+            squares = ["1"] * 64
+            flip = 0 if strongIsWhite else 56
+            squares[strongKing ^ flip] = "K" if strongIsWhite else "k"
+            squares[weakKing ^ flip] = "k" if strongIsWhite else "K"
+            squares[pieceSquare ^ flip] = names[pieceType] if strongIsWhite else names[pieceType].lower()
+            placement = "/".join("".join(squares[row * 8:row * 8 + 8]) for row in range(8))
+            whiteToMove = strongToMove == strongIsWhite
+            gs = GameState(placement + (" w" if whiteToMove else " b") + " - - 0 1")
+            result = probe(gs)
+            moves = gs.getValidMoves()
+            expected = DRAW
+            if not moves:
+                expected = LOSS if gs.checkmate else DRAW
+            else:
+                childResults = []
+                for move in moves:
+                    gs.makeMove(move)
+                    childResults.append(probe(gs) if gs.whitePieceCount + gs.blackPieceCount <= 3 else None)
+                    gs.undoMove()
+                if LOSS in childResults:
+                    expected = WIN
+                elif all(child == WIN for child in childResults):
+                    expected = LOSS
+            if result != expected:
+                errors += 1
+                print("%s: probe %s, successors say %s" % (gs.getFen(), result, expected))
+    print("%d positions checked, %d errors" % (samples * len(ENDINGS), errors))
+    return errors == 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="KPK, KRK and KQK bitbases")
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("generate", help="generate the bitbase files in assets/")
+    verifyCommand = commands.add_parser("verify", help="check random positions against their successors")
+    verifyCommand.add_argument("samples", type=int, nargs="?", default=2000)
+    args = parser.parse_args()
+    if args.command == "generate":
+        generateAll()
+    elif args.command == "verify":
+        sys.exit(0 if verify(args.samples) else 1)
+
+
+if __name__ == "__main__":
+    main()
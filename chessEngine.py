@@ -1,10 +1,198 @@
 """
 This class is responsible for storing all the information about the current state of a chess game. It will also be responsible for determining the valid moves at the current state. It will also keep a move log.
 """
+import random
+
+# The board is stored as a flat list of 64 ints (GameState.squares), square = row * 8 + col, row 0 being black's back rank.
+# A piece is its color bit or'ed with its type, so color and type tests are a single & instead of string indexing.
+EMPTY = 0
+PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING = 1, 2, 3, 4, 5, 6
+WHITE = 8
+BLACK = 16
+TYPE_MASK = 7
+COLOR_MASK = WHITE | BLACK
+
+# conversions between piece codes and the two character names used by the GUI ("wp", "bK", "--")
+pieceCodes = {"--": EMPTY}
+for colorName, color in (("w", WHITE), ("b", BLACK)):
+    for typeName, pieceType in (("p", PAWN), ("N", KNIGHT), ("B", BISHOP), ("R", ROOK), ("Q", QUEEN), ("K", KING)):
+        pieceCodes[colorName + typeName] = color | pieceType
+pieceNames = ["--"] * ((BLACK | KING) + 1)
+for name, code in pieceCodes.items():
+    pieceNames[code] = name
+
+
+def squareIndex(row, col):
+    return row * 8 + col
+
+
+def boardToSquares(board):
+    '''
+    8x8 list of lists of piece names -> flat list of 64 piece codes
+    '''
+    return [pieceCodes[board[row][col]] for row in range(8) for col in range(8)]
+
+
+class BoardView():
+    '''
+    Read only gs.board[row][col] access returning the piece names, so code written against the old
+    list of lists board (like the drawing code in chessMain) keeps working on top of GameState.squares.
+    '''
+    def __init__(self, squares):
+        self.squares = squares
+
+    def __getitem__(self, row):
+        return [pieceNames[piece] for piece in self.squares[row * 8:row * 8 + 8]]
+
+    def __len__(self):
+        return 8
+
+    def __iter__(self):
+        for row in range(8):
+            yield self[row]
+
+
+# precomputed move tables, so generation never has to check for falling off the board
+# directions are indexed like in checkForPinsAndChecks: 0-3 orthogonal, 4-7 diagonal
+directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
+oppositeDirection = (2, 3, 0, 1, 7, 6, 5, 4)
+slidingDirections = {ROOK: (0, 1, 2, 3), BISHOP: (4, 5, 6, 7), QUEEN: (0, 1, 2, 3, 4, 5, 6, 7)}
+knightJumps = ((-2, -1), (-2, 1), (-1, -2), (-1, 2), (1, -2), (1, 2), (2, -1), (2, 1))
+rays = [] # rays[square][direction] = squares in that direction, nearest first
+knightTargets = []
+kingTargets = []
+pawnAttackers = {WHITE: [], BLACK: []} # pawnAttackers[color][square] = squares from which a pawn of that color attacks square
+for square in range(64):
+    row, col = divmod(square, 8)
+    squareRays = []
+    for d in directions:
+        ray = []
+        endRow, endCol = row + d[0], col + d[1]
+        while 0 <= endRow < 8 and 0 <= endCol < 8:
+            ray.append(endRow * 8 + endCol)
+            endRow, endCol = endRow + d[0], endCol + d[1]
+        squareRays.append(tuple(ray))
+    rays.append(tuple(squareRays))
+    knightTargets.append(tuple((row + m[0]) * 8 + col + m[1] for m in knightJumps if 0 <= row + m[0] < 8 and 0 <= col + m[1] < 8))
+    kingTargets.append(tuple(ray[0] for ray in squareRays if ray))
+    pawnAttackers[WHITE].append(tuple((row + 1) * 8 + col + dc for dc in (-1, 1) if row < 7 and 0 <= col + dc < 8))
+    pawnAttackers[BLACK].append(tuple((row - 1) * 8 + col + dc for dc in (-1, 1) if row > 0 and 0 <= col + dc < 8))
+
+# castling rights are 4 bits; a move from or to one of these squares clears the rights that depend on it
+WKS, WQS, BKS, BQS = 1, 2, 4, 8
+castleRightsMask = [WKS | WQS | BKS | BQS] * 64
+castleRightsMask[squareIndex(7, 4)] &= ~(WKS | WQS)
+castleRightsMask[squareIndex(7, 7)] &= ~WKS
+castleRightsMask[squareIndex(7, 0)] &= ~WQS
+castleRightsMask[squareIndex(0, 4)] &= ~(BKS | BQS)
+castleRightsMask[squareIndex(0, 7)] &= ~BKS
+castleRightsMask[squareIndex(0, 0)] &= ~BQS
+
+# evaluation tables (scoreBoard in smartMoveFinder), kept here so makeMove/undoMove can update the running score
+pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
+
+knightScores = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
+                 [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
+                 [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
+                 [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
+                 [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
+                 [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
+                 [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
+                 [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
+
+bishopScores = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
+                 [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
+                 [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
+                 [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
+                 [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
+                 [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
+                 [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
+                 [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
+
+rookScores = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
+               [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
+               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
+               [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
+
+queenScores = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
+                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
+                [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
+                [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
+                [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
+                [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
+                [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
+                [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
+
+pawnScores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
+               [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
+               [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
+               [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
+               [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
+               [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
+               [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
+               [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
+
+piecePositionScores = {  "wN": knightScores,
+                         "bN": knightScores[::-1],
+                         "wB": bishopScores,
+                         "bB": bishopScores[::-1],
+                         "wQ": queenScores,
+                         "bQ": queenScores[::-1],
+                         "wR": rookScores,
+                         "bR": rookScores[::-1],
+                         "wp": pawnScores,
+                         "bp": pawnScores[::-1]}
+
+# the same tables indexed by piece code and square: material plus position score from white's point of view, in
+# centipawns so the running total in GameState is an exact integer however many moves are made and undone
+pieceSquareScores = [None] * len(pieceNames)
+for name, code in pieceCodes.items():
+    if code != EMPTY:
+        sign = 1 if code & WHITE else -1
+        positionScores = piecePositionScores.get(name, [[0] * 8] * 8) # kings have no position score
+        pieceSquareScores[code] = [sign * round(100 * (pieceScore[name[1]] + positionScores[square >> 3][square & 7])) for square in range(64)]
+
+# Zobrist hashing: every (piece, square), castling right, en passant file and the side to move gets a random 64 bit number.
+# The key of a position is the XOR of the numbers of everything in it, so makeMove only has to XOR in/out what changed.
+# The seed is fixed so that every process (GUI, search worker) computes the same keys.
+zobristRandom = random.Random(20230521)
+zobristPieces = [None] * len(pieceNames)
+for code in sorted(pieceCodes.values()):
+    if code != EMPTY:
+        zobristPieces[code] = [zobristRandom.getrandbits(64) for square in range(64)]
+zobristCastleRights = [zobristRandom.getrandbits(64) for right in (WKS, BKS, WQS, BQS)]
+zobristCastle = [0] * 16 # key of every combination of castle rights
+for rights in range(16):
+    for i, right in enumerate((WKS, BKS, WQS, BQS)):
+        if rights & right:
+            zobristCastle[rights] ^= zobristCastleRights[i]
+zobristEnPassant = [zobristRandom.getrandbits(64) for col in range(8)]
+zobristBlackToMove = zobristRandom.getrandbits(64)
+
+
+def computeZobristKey(gs):
+    '''
+    computes the zobrist key of a position from scratch (makeMove/undoMove keep gs.zobristKey up to date incrementally)
+    '''
+    key = 0
+    for square, piece in enumerate(gs.squares):
+        if piece != EMPTY:
+            key ^= zobristPieces[piece][square]
+    key ^= zobristCastle[gs.castleRights]
+    if gs.enPassantSquare != -1:
+        key ^= zobristEnPassant[gs.enPassantSquare & 7]
+    if not gs.whiteToMove:
+        key ^= zobristBlackToMove
+    return key
+
 
 class GameState():
-    def __init__(self):
-        self.board = [
+    def __init__(self, fen=None):
+        self.squares = boardToSquares([
             ["bR", "bN", "bB", "bQ", "bK", "bB", "bN", "bR"],
             ["bp", "bp", "bp", "bp", "bp", "bp", "bp", "bp"],
             ["--", "--", "--", "--", "--", "--", "--", "--"],
@@ -13,156 +201,280 @@ class GameState():
             ["--", "--", "--", "--", "--", "--", "--", "--"],
             ["wp", "wp", "wp", "wp", "wp", "wp", "wp", "wp"],
             ["wR", "wN", "wB", "wQ", "wK", "wB", "wN", "wR"],
-        ]
-        self.moveFunctions = {'p': self.getPawnMoves, 'R': self.getRookMoves, 'N': self.getKnightMoves, 'B': self.getBishopMoves, 'Q': self.getQueenMoves, 'K': self.getKingMoves}
+        ])
+        self.moveFunctions = {PAWN: self.getPawnMoves, ROOK: self.getRookMoves, KNIGHT: self.getKnightMoves, BISHOP: self.getBishopMoves, QUEEN: self.getQueenMoves, KING: self.getKingMoves}
         self.whiteToMove = True
-        self.whiteKingLocation = (7, 4)
-        self.blackKingLocation = (0, 4)
+        self.whiteKingSquare = squareIndex(7, 4)
+        self.blackKingSquare = squareIndex(0, 4)
         # 3 for checks and pins
         self.inCheck = False
-        self.pins = []
-        self.checks = []
-        
+        self.pins = {} # pinned square -> direction index from the king
+        self.checks = [] # (square of checking piece, direction index from the king or -1 for a knight)
+
         self.checkmate = False
         self.stalemate = False
         self.moveLog = []
-        self.enPassantPossible = ()  # coordinates for the square where en passant capture is possible
-        self.enPassantPossibleLog = [self.enPassantPossible]
-        self.currentCastlingRight = CastleRights(True, True, True, True)
-        self.castleRightsLog = [CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs, self.currentCastlingRight.bqs)]
+        self.enPassantSquare = -1  # square where en passant capture is possible, -1 if none
+        self.castleRights = WKS | WQS | BKS | BQS
+        self.halfmoveClock = 0 # plies since the last capture or pawn move, for the fifty move rule
+        self.fullmoveNumber = 1 # starts at 1, goes up after every black move
+        self.refreshIncrementalState()
+        if fen is not None:
+            self.loadFen(fen)
+
+    def loadFen(self, fen):
+        '''
+        sets up the position of a FEN string: piece placement, side to move, castling rights, en passant square and the
+        halfmove clock and fullmove number (0 and 1 when they are left out, as in EPD)
+        '''
+        fields = fen.split()
+        if not fields:
+            raise ValueError("empty FEN")
+        squares = []
+        for char in fields[0]:
+            if char == "/":
+                continue
+            if char.isdigit():
+                squares.extend([EMPTY] * int(char))
+            elif char.upper() in "PNBRQK":
+                squares.append(pieceCodes[("w" if char.isupper() else "b") + ("p" if char in "Pp" else char.upper())])
+            else:
+                raise ValueError("invalid piece %r in FEN %r" % (char, fen))
+        if len(squares) != 64 or squares.count(WHITE | KING) != 1 or squares.count(BLACK | KING) != 1:
+            raise ValueError("invalid piece placement in FEN %r" % fen)
+        if any(squares[square] & TYPE_MASK == PAWN for square in list(range(8)) + list(range(56, 64))):
+            raise ValueError("pawn on the first or last rank in FEN %r" % fen)
+        self.squares = squares
+        self.whiteKingSquare = squares.index(WHITE | KING)
+        self.blackKingSquare = squares.index(BLACK | KING)
+        if len(fields) > 1 and fields[1] not in ("w", "b"):
+            raise ValueError("invalid side to move in FEN %r" % fen)
+        self.whiteToMove = len(fields) < 2 or fields[1] == "w"
+        castling = fields[2] if len(fields) > 2 else "-"
+        self.castleRights = 0
+        # a right only counts with the king and the rook on their starting squares, castling moves assume them there
+        for right, letter, color, kingSquare, rookSquare in ((WKS, "K", WHITE, 60, 63), (WQS, "Q", WHITE, 60, 56), (BKS, "k", BLACK, 4, 7), (BQS, "q", BLACK, 4, 0)):
+            if letter in castling and squares[kingSquare] == color | KING and squares[rookSquare] == color | ROOK:
+                self.castleRights |= right
+        enPassant = fields[3] if len(fields) > 3 else "-"
+        if enPassant != "-" and (len(enPassant) != 2 or enPassant[0] not in Move.filesToCols or enPassant[1] not in "36"):
+            raise ValueError("invalid en passant square in FEN %r" % fen)
+        self.enPassantSquare = -1
+        if enPassant != "-":
+            # only kept when a pawn of the side not to move can just have made the double step over it, like the castling
+            # rights above: the en passant capture takes that pawn without checking it is there
+            square = squareIndex(Move.ranksToRows[enPassant[1]], Move.filesToCols[enPassant[0]])
+            forward = 8 if self.whiteToMove else -8 # from the square to the pawn that made the double step
+            if (enPassant[1] == ("6" if self.whiteToMove else "3") and squares[square + forward] == (BLACK if self.whiteToMove else WHITE) | PAWN
+                    and squares[square] == EMPTY and squares[square - forward] == EMPTY):
+                self.enPassantSquare = square
+        if len(fields) == 5 or (len(fields) > 5 and not (fields[4].isdigit() and fields[5].isdigit())):
+            raise ValueError("invalid move counters in FEN %r" % fen)
+        self.halfmoveClock = int(fields[4]) if len(fields) > 5 else 0
+        self.fullmoveNumber = max(1, int(fields[5])) if len(fields) > 5 else 1
+        # the side that just moved can't have left its king in check, the side to move could take it
+        self.whiteToMove = not self.whiteToMove
+        kingAttacked = self.squareUnderAttack(self.whiteKingSquare if self.whiteToMove else self.blackKingSquare)
+        self.whiteToMove = not self.whiteToMove
+        if kingAttacked:
+            raise ValueError("the side not to move is in check in FEN %r" % fen)
+        self.moveLog = []
+        self.inCheck = self.checkmate = self.stalemate = False
+        self.pins = {}
+        self.checks = []
+        self.refreshIncrementalState()
+
+    def refreshIncrementalState(self):
+        '''
+        recomputes from scratch what makeMove/undoMove keep up to date incrementally: the zobrist key,
+        the material + piece square score (centipawns, white's point of view) and the number of pieces per side
+        '''
+        self.zobristKey = computeZobristKey(self)
+        self.pieceSquareScore = 0
+        self.whitePieceCount = 0
+        self.blackPieceCount = 0
+        for square, piece in enumerate(self.squares):
+            if piece != EMPTY:
+                self.pieceSquareScore += pieceSquareScores[piece][square]
+                if piece & WHITE:
+                    self.whitePieceCount += 1
+                else:
+                    self.blackPieceCount += 1
+        # what undoMove can't recompute from the move itself, after each move
+        self.stateLog = [(self.castleRights, self.enPassantSquare, self.zobristKey, self.pieceSquareScore, self.whitePieceCount, self.blackPieceCount,
+                          self.halfmoveClock, self.fullmoveNumber)]
+
+    def getFen(self):
+        '''
+        the position as a FEN string, including the halfmove clock and fullmove number
+        '''
+        rows = []
+        for row in range(8):
+            text = ""
+            emptySquares = 0
+            for piece in self.squares[row * 8:row * 8 + 8]:
+                if piece == EMPTY:
+                    emptySquares += 1
+                    continue
+                if emptySquares:
+                    text += str(emptySquares)
+                    emptySquares = 0
+                letter = pieceNames[piece][1].upper()
+                text += letter if piece & WHITE else letter.lower()
+            if emptySquares:
+                text += str(emptySquares)
+            rows.append(text)
+        castling = "".join(letter for right, letter in ((WKS, "K"), (WQS, "Q"), (BKS, "k"), (BQS, "q")) if self.castleRights & right) or "-"
+        enPassant = Move.colsToFiles[self.enPassantSquare & 7] + Move.rowsToRanks[self.enPassantSquare >> 3] if self.enPassantSquare != -1 else "-"
+        return "%s %s %s %s %d %d" % ("/".join(rows), "w" if self.whiteToMove else "b", castling, enPassant, self.halfmoveClock, self.fullmoveNumber)
+
+    @property
+    def board(self):
+        return BoardView(self.squares)
+
+    @property
+    def whiteKingLocation(self):
+        return divmod(self.whiteKingSquare, 8)
 
+    @property
+    def blackKingLocation(self):
+        return divmod(self.blackKingSquare, 8)
 
-    # Takes a move as a parameter and executes it (this will not work for castling, pawn promotion and en-passant)
+
+    # Takes a move as a parameter and executes it (including castling, pawn promotion and en-passant)
     def makeMove(self, move):
-        self.board[move.startRow][move.startCol] = "--"
-        self.board[move.endRow][move.endCol] = move.pieceMoved
-        self.moveLog.append(move) # log the move so we can undo it later
-        self.whiteToMove = not self.whiteToMove # swap players
+        squares = self.squares
+        start, end = move.startSq, move.endSq
+        piece = move.pieceMoved
+
+        # zobrist key: the moved piece leaves its start square, side to move flips, old en passant square and castle rights go
+        key = self.zobristKey ^ zobristBlackToMove ^ zobristPieces[piece][start] ^ zobristCastle[self.castleRights]
+        if self.enPassantSquare != -1:
+            key ^= zobristEnPassant[self.enPassantSquare & 7]
+        score = self.pieceSquareScore - pieceSquareScores[piece][start]
+
+        squares[start] = EMPTY
+        captured = move.pieceCaptured
+        if captured != EMPTY:
+            #en passant
+            if move.isenPassantMove:
+                capturedSquare = start - (start & 7) + (end & 7) # the captured pawn is beside the start square
+                squares[capturedSquare] = EMPTY
+            else:
+                capturedSquare = end
+            key ^= zobristPieces[captured][capturedSquare]
+            score -= pieceSquareScores[captured][capturedSquare]
+            if captured & WHITE:
+                self.whitePieceCount -= 1
+            else:
+                self.blackPieceCount -= 1
 
-        # update king's location if moved
-        if move.pieceMoved == 'wK':
-            self.whiteKingLocation = (move.endRow, move.endCol)
-        elif move.pieceMoved == 'bK':
-            self.blackKingLocation = (move.endRow, move.endCol)
-        
-        #if pawn moves twice, next move will be en passant
-        #update enPassantPossible variable
-        if move.pieceMoved[1] == 'p' and abs(move.startRow - move.endRow) == 2: #only on 2 square pawn advances
-            self.enPassantPossible = ((move.startRow + move.endRow) // 2, move.startCol)
-        else:
-            self.enPassantPossible = ()
-        
-        #en passant
-        if move.isenPassantMove:
-            self.board[move.startRow][move.endCol] = '--'
-        
         #pawn promotion
         if move.isPawnPromotion:
-            self.board[move.endRow][move.endCol] = move.pieceMoved[0] + 'Q'
-        
+            piece = (piece & COLOR_MASK) | move.promotionPiece
+        squares[end] = piece
+        key ^= zobristPieces[piece][end]
+        score += pieceSquareScores[piece][end]
+
+        # update king's location if moved
+        if piece == WHITE | KING:
+            self.whiteKingSquare = end
+        elif piece == BLACK | KING:
+            self.blackKingSquare = end
+
         #castle move
         if move.isCastleMove:
-            if move.endCol - move.startCol == 2: #kingside castle
-                if move.endCol + 1 < len(self.board[move.endRow]):
-                    self.board[move.endRow][move.endCol - 1] = self.board[move.endRow][move.endCol + 1] #moves the rook
-                    self.board[move.endRow][move.endCol + 1] = '--' #erase old rook
+            if end > start: #kingside castle
+                rookStart, rookEnd = end + 1, end - 1
             else: #queenside castle
-                if move.endCol - 2 >= 0:
-                    self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 2] #moves the rook
-                    self.board[move.endRow][move.endCol - 2] = '--' #erase old rook
-        
-        self.enPassantPossibleLog.append(self.enPassantPossible)
-        
-        #update castling rights - whenever it is a rook or a king move
-        self.updateCastleRights(move)
-        self.castleRightsLog.append(CastleRights(self.currentCastlingRight.wks, self.currentCastlingRight.bks, self.currentCastlingRight.wqs, self.currentCastlingRight.bqs))
-
-
-    
-    def updateCastleRights(self, move):
-        '''
-        update castling rights whenever it is a rook or a king move
-        '''
-        # if a rook is captured, update the castleRights
-        if move.pieceCaptured == 'wR':
-            if move.endRow == 7:
-                if move.endCol == 0:
-                    self.currentCastlingRight.wqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRight.wks = False
-        elif move.pieceCaptured == 'bR':
-            if move.endRow == 0:
-                if move.endCol == 0:
-                    self.currentCastlingRight.bqs = False
-                elif move.endCol == 7:
-                    self.currentCastlingRight.bks = False
-
-        if move.pieceMoved == 'wK':
-            self.currentCastlingRight.wks = False
-            self.currentCastlingRight.wqs = False
-        elif move.pieceMoved == 'bK':
-            self.currentCastlingRight.bks = False
-            self.currentCastlingRight.bqs = False
-        
-        elif move.pieceMoved == 'wR':
-            if move.startRow == 7:
-                if move.startCol == 0:
-                    self.currentCastlingRight.wqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRight.wks = False
-        elif move.pieceMoved == 'bR':
-            if move.startRow == 0:
-                if move.startCol == 0:
-                    self.currentCastlingRight.bqs = False
-                elif move.startCol == 7:
-                    self.currentCastlingRight.bks = False
-        
-        
+                rookStart, rookEnd = end - 2, end + 1
+            rook = squares[rookStart]
+            squares[rookEnd] = rook #moves the rook
+            squares[rookStart] = EMPTY #erase old rook
+            key ^= zobristPieces[rook][rookStart] ^ zobristPieces[rook][rookEnd]
+            score += pieceSquareScores[rook][rookEnd] - pieceSquareScores[rook][rookStart]
+
+        #if pawn moves twice, next move will be en passant
+        if piece & TYPE_MASK == PAWN and abs(start - end) == 16: #only on 2 square pawn advances
+            self.enPassantSquare = (start + end) // 2
+            key ^= zobristEnPassant[start & 7]
+        else:
+            self.enPassantSquare = -1
+
+        #update castling rights - whenever it is a rook or a king move, or a rook is captured
+        self.castleRights &= castleRightsMask[start] & castleRightsMask[end]
+        key ^= zobristCastle[self.castleRights]
+
+        # move counters: captures and pawn moves reset the fifty move clock, a black move ends a full move
+        if captured != EMPTY or move.pieceMoved & TYPE_MASK == PAWN:
+            self.halfmoveClock = 0
+        else:
+            self.halfmoveClock += 1
+        if not self.whiteToMove:
+            self.fullmoveNumber += 1
+
+        self.whiteToMove = not self.whiteToMove # swap players
+        self.zobristKey = key
+        self.pieceSquareScore = score
+        self.moveLog.append(move) # log the move so we can undo it later
+        self.stateLog.append((self.castleRights, self.enPassantSquare, key, score, self.whitePieceCount, self.blackPieceCount,
+                              self.halfmoveClock, self.fullmoveNumber))
+
+    # Null move for the search's null move pruning: the side to move passes. Only the side to move and the en passant
+    # square change, None in the move log stands for it (undoMove takes it back too)
+    def makeNullMove(self):
+        key = self.zobristKey ^ zobristBlackToMove
+        if self.enPassantSquare != -1:
+            key ^= zobristEnPassant[self.enPassantSquare & 7]
+            self.enPassantSquare = -1
+        self.whiteToMove = not self.whiteToMove
+        self.zobristKey = key
+        self.moveLog.append(None)
+        self.stateLog.append((self.castleRights, -1, key, self.pieceSquareScore, self.whitePieceCount, self.blackPieceCount,
+                              self.halfmoveClock, self.fullmoveNumber))
+
+    def undoNullMove(self):
+        self.moveLog.pop()
+        self.whiteToMove = not self.whiteToMove
+        self.stateLog.pop()
+        self.enPassantSquare, self.zobristKey = self.stateLog[-1][1], self.stateLog[-1][2]
 
     # Undo last move
     def undoMove(self):
-        if len(self.moveLog) != 0:
+        if self.moveLog and self.moveLog[-1] is None:
+            self.undoNullMove()
+        elif len(self.moveLog) != 0:
             move = self.moveLog.pop()
-            self.board[move.startRow][move.startCol] = move.pieceMoved
-            self.board[move.endRow][move.endCol] = move.pieceCaptured
+            squares = self.squares
+            start, end = move.startSq, move.endSq
+            squares[start] = move.pieceMoved
+            #undo en passant is different
+            if move.isenPassantMove:
+                squares[end] = EMPTY # leave landing square blank
+                squares[start - (start & 7) + (end & 7)] = move.pieceCaptured
+            else:
+                squares[end] = move.pieceCaptured
             self.whiteToMove = not self.whiteToMove # swap players
 
             # update king's location if moved
-            if move.pieceMoved == 'wK':
-                self.whiteKingLocation = (move.startRow, move.startCol)
-            elif move.pieceMoved == 'bK':
-                self.blackKingLocation = (move.startRow, move.startCol)
-            
-            #undo en passant is different
-            if move.isenPassantMove:
-                self.board[move.endRow][move.endCol] = '--' # leave landing square blank
-                self.board[move.startRow][move.endCol] = move.pieceCaptured
-            
-            self.enPassantPossibleLog.pop()
-            self.enPassantPossible = self.enPassantPossibleLog[-1]
-
-            # undo castling rights
-            self.castleRightsLog.pop() # get rid of the new castle rights from the move just undone
-            self.currentCastlingRight = self.castleRightsLog[-1] # set the current castle rights to the last one in the list
-
-            # update the king's position in castling rights if necessary
-            if move.pieceMoved == 'wK':
-                self.currentCastlingRight.wks = True
-                self.currentCastlingRight.wqs = True
-            elif move.pieceMoved == 'bK':
-                self.currentCastlingRight.bqs = True
-                self.currentCastlingRight.bks = True
+            if move.pieceMoved == WHITE | KING:
+                self.whiteKingSquare = start
+            elif move.pieceMoved == BLACK | KING:
+                self.blackKingSquare = start
 
             # undo castle move
             if move.isCastleMove:
-                if move.endCol - move.startCol == 2: #kingside castle
-                    if move.endCol + 1 < len(self.board[move.endRow]):
-                        self.board[move.endRow][move.endCol + 1] = self.board[move.endRow][move.endCol - 1] #moves the rook
-                        self.board[move.endRow][move.endCol - 1] = '--' #erase old rook
+                if end > start: #kingside castle
+                    rookStart, rookEnd = end + 1, end - 1
                 else: #queenside castle
-                    if move.endCol - 2 >= 0:
-                        self.board[move.endRow][move.endCol - 2] = self.board[move.endRow][move.endCol + 1] #moves the rook
-                        self.board[move.endRow][move.endCol + 1] = '--' #erase old rook
+                    rookStart, rookEnd = end - 2, end + 1
+                squares[rookStart] = squares[rookEnd] #moves the rook
+                squares[rookEnd] = EMPTY #erase old rook
+
+            # castle rights, en passant square, zobrist key, score, piece counts and move counters from before the move
+            self.stateLog.pop()
+            (self.castleRights, self.enPassantSquare, self.zobristKey, self.pieceSquareScore, self.whitePieceCount, self.blackPieceCount,
+             self.halfmoveClock, self.fullmoveNumber) = self.stateLog[-1]
 
             self.checkmate = False
             self.stalemate = False
@@ -171,48 +483,31 @@ class GameState():
     def getValidMoves(self):
         moves = []
         self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
-        if self.whiteToMove:
-            kingRow, kingCol = self.whiteKingLocation
-        else:
-            kingRow, kingCol = self.blackKingLocation
+        kingSquare = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
 
         if self.inCheck:
             if len(self.checks) == 1: # only 1 check, block check or move king
                 moves = self.getAllPossibleMoves()
                 # to block the check you must put a piece into one of the squares between the enemy piece and your king
-                check = self.checks[0]
-                checkRow, checkCol = check[0], check[1]
-                pieceChecking = self.board[checkRow][checkCol]
-                validSquares = []
-                if pieceChecking[1] == 'N': # if knight, must capture knight or move king, other pieces can be blocked
-                    validSquares = [(checkRow, checkCol)]
+                checkSquare, checkDirection = self.checks[0]
+                if checkDirection == -1: # if knight, must capture knight or move king, other pieces can be blocked
+                    validSquares = {checkSquare}
                 else:
-                    for i in range(1, 8):
-                        validSquare = (kingRow + check[2] * i, kingCol + check[3] * i) # check[2] and check[3] are the check directions
-                        validSquares.append(validSquare)
-                        if validSquare[0] == checkRow and validSquare[1] == checkCol: # once you get to your king, stop
+                    validSquares = set()
+                    for validSquare in rays[kingSquare][checkDirection]:
+                        validSquares.add(validSquare)
+                        if validSquare == checkSquare: # once you get to the checking piece, stop
                             break
                 # get rid of moves that don't block check or move king
-                for i in range(len(moves) - 1, -1, -1):
-                    if moves[i].pieceMoved[1] != 'K': # move doesn't move king so it must block or capture
-                        if (moves[i].endRow, moves[i].endCol) not in validSquares: # move doesn't block check or capture piece
-                            moves.remove(moves[i])
+                moves = [move for move in moves if move.pieceMoved & TYPE_MASK == KING or move.endSq in validSquares
+                         or (move.isenPassantMove and move.startSq - (move.startSq & 7) + (move.endSq & 7) in validSquares)]
             else: # double check, king has to move
-                self.getKingMoves(kingRow, kingCol, moves)
+                self.getKingMoves(kingSquare, moves)
         else: # not in check so all moves are fine
             moves = self.getAllPossibleMoves()
 
-            # Include castling moves for white
-            if self.whiteToMove:
-                if self.currentCastlingRight.wks:
-                    self.getKingsideCastleMoves(kingRow, kingCol, moves)
-                if self.currentCastlingRight.wqs:
-                    self.getQueensideCastleMoves(kingRow, kingCol, moves)
-            else: # castling moves for black
-                if self.currentCastlingRight.bks:
-                    self.getKingsideCastleMoves(kingRow, kingCol, moves)
-                if self.currentCastlingRight.bqs:
-                    self.getQueensideCastleMoves(kingRow, kingCol, moves)
+            # Include castling moves
+            self.getCastleMoves(kingSquare, moves)
 
         if len(moves) == 0:
             if self.inCheck:
@@ -223,309 +518,477 @@ class GameState():
             self.checkmate = False
             self.stalemate = False
         return moves
-    
+
+    # The legal move written in coordinate notation as by Move.getChessNotation ("e2e4", "e7e8q"), None if there is none
+    def getMoveFromNotation(self, notation):
+        for move in self.getValidMoves():
+            if move.getChessNotation() == notation:
+                return move
+        return None
+
+    # A legal move in standard algebraic notation ("Nbd2", "exd5", "O-O", "e8=Q+"), as used by PGN and EPD
+    def getSan(self, move):
+        savedState = (self.inCheck, self.pins, self.checks, self.checkmate, self.stalemate)
+        san = self.getSanWithoutCheck(move, self.getValidMoves())
+        self.makeMove(move)
+        self.getValidMoves()
+        if self.checkmate:
+            san += "#"
+        elif self.inCheck:
+            san += "+"
+        self.undoMove()
+        self.inCheck, self.pins, self.checks, self.checkmate, self.stalemate = savedState
+        return san
+
+    # getSan without the check or checkmate mark, validMoves are the legal moves of the position
+    def getSanWithoutCheck(self, move, validMoves):
+        pieceType = move.pieceMoved & TYPE_MASK
+        target = move.getRankFile(move.endRow, move.endCol)
+        if move.isCastleMove:
+            san = "O-O" if move.endSq > move.startSq else "O-O-O"
+        elif pieceType == PAWN:
+            san = (move.getRankFile(move.startRow, move.startCol)[0] + "x" if move.pieceCaptured != EMPTY else "") + target
+            if move.isPawnPromotion:
+                san += "=" + pieceNames[WHITE | move.promotionPiece][1]
+        else:
+            san = pieceNames[move.pieceMoved][1]
+            # the same kind of piece can also get to the target square: add the file, the rank or both of the start square
+            others = [other.startSq for other in validMoves if other.pieceMoved == move.pieceMoved and other.endSq == move.endSq and other.startSq != move.startSq]
+            start = move.getRankFile(move.startRow, move.startCol)
+            if others:
+                if all(square & 7 != move.startSq & 7 for square in others):
+                    san += start[0]
+                elif all(square >> 3 != move.startSq >> 3 for square in others):
+                    san += start[1]
+                else:
+                    san += start
+            san += ("x" if move.pieceCaptured != EMPTY else "") + target
+        return san
+
+    # The legal move written in standard algebraic notation, None if there is none. Check marks and annotations are optional
+    def getMoveFromSan(self, san):
+        san = san.rstrip("+#!?").replace("0", "O")
+        validMoves = self.getValidMoves()
+        for move in validMoves:
+            if self.getSanWithoutCheck(move, validMoves) == san:
+                return move
+        return None
+
+    # Only captures and queen promotions, considering checks. Used by the quiescence search, which doesn't need the quiet moves
+    # (and does not update checkmate/stalemate, a position without captures is not necessarily the end of the game)
+    def getValidCaptures(self, checkState=None):
+        # checkState is what checkForPinsAndChecks returned, when the caller has already worked it out for this position
+        moves = []
+        self.inCheck, self.pins, self.checks = checkState if checkState is not None else self.checkForPinsAndChecks()
+        kingSquare = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
+        if self.inCheck and len(self.checks) > 1: # double check, only the king can capture
+            self.getKingMoves(kingSquare, moves, capturesOnly=True)
+            return moves
+
+        self.getAllCaptureMoves(moves, underpromotions=False)
+
+        if self.inCheck: # single check, the capture has to take the checking piece (or be made by the king)
+            checkSquare = self.checks[0][0]
+            moves = [move for move in moves if move.pieceMoved & TYPE_MASK == KING or move.endSq == checkSquare
+                     or (move.isenPassantMove and move.startSq - (move.startSq & 7) + (move.endSq & 7) == checkSquare)]
+        return moves
+
+    # Legal moves in stages for the search: the hash move, then captures and promotions, then the quiet moves. A stage is only
+    # generated when the search asks for its first move, so a node that cuts off on the hash move or a capture never pays for
+    # the quiet moves. Doesn't update checkmate/stalemate (no move comes out then); getValidMoves is still the full list.
+    def getValidMovesStaged(self, hashMove=None, sortKey=None):
+        # checks and pins are worked out now so gs.inCheck is right as soon as this returns
+        self.inCheck, self.pins, self.checks = self.checkForPinsAndChecks()
+        return self.stagedMoves(self.inCheck, self.pins, self.checks, hashMove, sortKey)
+
+    def stagedMoves(self, inCheck, pins, checks, hashMove, sortKey):
+        if inCheck: # only a few evasions, generate them at once
+            moves = self.getValidMoves()
+            if sortKey is not None:
+                moves.sort(key=sortKey, reverse=True)
+            yield from moves
+            return
+        kingSquare = self.whiteKingSquare if self.whiteToMove else self.blackKingSquare
+
+        # the search runs other nodes in between stages, so every stage first puts back this node's pins
+        self.inCheck, self.pins, self.checks = inCheck, pins, checks
+        hashMoveID = -1
+        if hashMove is not None and self.squares[hashMove.startSq] == hashMove.pieceMoved and hashMove.pieceMoved & (WHITE if self.whiteToMove else BLACK):
+            pieceMoves = []
+            if hashMove.isCastleMove:
+                self.getCastleMoves(kingSquare, pieceMoves)
+            else:
+                self.moveFunctions[hashMove.pieceMoved & TYPE_MASK](hashMove.startSq, pieceMoves)
+            for move in pieceMoves:
+                if move.moveID == hashMove.moveID: # the hash move is legal here
+                    hashMoveID = move.moveID
+                    yield move
+                    break
+
+        self.inCheck, self.pins, self.checks = inCheck, pins, checks
+        captures = []
+        self.getAllCaptureMoves(captures, underpromotions=True)
+        if sortKey is not None:
+            captures.sort(key=sortKey, reverse=True)
+        for move in captures:
+            if move.moveID != hashMoveID:
+                yield move
+
+        self.inCheck, self.pins, self.checks = inCheck, pins, checks
+        quiets = []
+        self.getAllQuietMoves(quiets)
+        self.getCastleMoves(kingSquare, quiets)
+        if sortKey is not None:
+            quiets.sort(key=sortKey, reverse=True)
+        for move in quiets:
+            if move.moveID != hashMoveID:
+                yield move
+
+    def getAllCaptureMoves(self, moves, underpromotions=True):
+        '''
+        captures and promotions of the side to move, with the pins of the last checkForPinsAndChecks
+        '''
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for square, piece in enumerate(self.squares):
+            if piece & allyColor:
+                pieceType = piece & TYPE_MASK
+                if pieceType == PAWN:
+                    self.getPawnCaptures(square, moves, promotionPush=True, underpromotions=underpromotions)
+                elif pieceType == KNIGHT:
+                    self.getKnightCaptures(square, moves)
+                elif pieceType == KING:
+                    self.getKingMoves(square, moves, capturesOnly=True)
+                else:
+                    self.getSlidingCaptures(square, moves, slidingDirections[pieceType])
+
+    def getAllQuietMoves(self, moves):
+        '''
+        moves of the side to move that neither capture nor promote (castling aside), with the pins of the last
+        checkForPinsAndChecks
+        '''
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for square, piece in enumerate(self.squares):
+            if piece & allyColor:
+                pieceType = piece & TYPE_MASK
+                if pieceType == PAWN:
+                    self.getPawnPushes(square, moves, promotions=False)
+                elif pieceType == KNIGHT:
+                    self.getKnightQuiets(square, moves)
+                elif pieceType == KING:
+                    self.getKingMoves(square, moves, quietsOnly=True)
+                else:
+                    self.getSlidingQuiets(square, moves, slidingDirections[pieceType])
+
     # All moves without considering checks
     def getAllPossibleMoves(self):
         moves = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                turn = self.board[r][c][0]
-                if (turn == 'w' and self.whiteToMove) or (turn == 'b' and not self.whiteToMove):
-                    piece = self.board[r][c][1]
-                    # calls appropriate move func based on piece
-                    self.moveFunctions[piece](r, c, moves)
-        return moves        
+        allyColor = WHITE if self.whiteToMove else BLACK
+        moveFunctions = self.moveFunctions
+        for square, piece in enumerate(self.squares):
+            if piece & allyColor:
+                # calls appropriate move func based on piece
+                moveFunctions[piece & TYPE_MASK](square, moves)
+        return moves
 
 
     def checkForPinsAndChecks(self):
-        pins = []  # squares pinned and the direction its pinned from
+        pins = {}  # squares pinned and the direction its pinned from
         checks = []  # squares where enemy is applying a check
         inCheck = False
-        
+        squares = self.squares
+
         if self.whiteToMove:
-            enemyColor = "b"
-            allyColor = "w"
-            startRow = self.whiteKingLocation[0]
-            startCol = self.whiteKingLocation[1]
+            enemyColor = BLACK
+            allyColor = WHITE
+            kingSquare = self.whiteKingSquare
+            pawnDirections = (4, 5) # enemy pawns attack the king from diagonally in front of it
         else:
-            enemyColor = "w"
-            allyColor = "b"
-            startRow = self.blackKingLocation[0]
-            startCol = self.blackKingLocation[1]
+            enemyColor = WHITE
+            allyColor = BLACK
+            kingSquare = self.blackKingSquare
+            pawnDirections = (6, 7)
         # check outwards from king for pins and checks, keep track of pins
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1), (-1, -1), (-1, 1), (1, -1), (1, 1))
-        for j in range(len(directions)):
-            d = directions[j]
-            possiblePin = ()  # reset possible pins
-            for i in range(1, 8):
-                endRow = startRow + d[0] * i
-                endCol = startCol + d[1] * i
-                if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] == allyColor and endPiece[1] != "K":
-                        if possiblePin == ():  # first allied piece could be pinned
-                            possiblePin = (endRow, endCol, d[0], d[1])
+        kingRays = rays[kingSquare]
+        for j in range(8):
+            possiblePin = -1  # reset possible pins
+            for i, endSquare in enumerate(kingRays[j]):
+                endPiece = squares[endSquare]
+                if endPiece == EMPTY:
+                    continue
+                if endPiece & allyColor:
+                    if endPiece & TYPE_MASK != KING:
+                        if possiblePin == -1:  # first allied piece could be pinned
+                            possiblePin = endSquare
                         else:  # 2nd allied piece - no check or pin from this direction
                             break
-                    elif endPiece[0] == enemyColor:
-                        enemyType = endPiece[1]
-                        # 5 possibilities in this complex conditional
-                        # 1.) orthogonally away from king and piece is a rook
-                        # 2.) diagonally away from king and piece is a bishop
-                        # 3.) 1 square away diagonally from king and piece is a pawn
-                        # 4.) any direction and piece is a queen
-                        # 5.) any direction 1 square away and piece is a king
-                        if (0 <= j <= 3 and enemyType == "R") or (4 <= j <= 7 and enemyType == "B") or (
-                                i == 1 and enemyType == "p" and (
-                                (enemyColor == "w" and 6 <= j <= 7) or (enemyColor == "b" and 4 <= j <= 5))) or (
-                                enemyType == "Q") or (i == 1 and enemyType == "K"):
-                            if possiblePin == ():  # no piece blocking, so check
-                                inCheck = True
-                                checks.append((endRow, endCol, d[0], d[1]))
-                                break
-                            else:  # piece blocking so pin
-                                pins.append(possiblePin)
-                                break
-                        else:  # enemy piece not applying checks
-                            break
                 else:
-                    break  # off board
+                    enemyType = endPiece & TYPE_MASK
+                    # 5 possibilities in this complex conditional
+                    # 1.) orthogonally away from king and piece is a rook
+                    # 2.) diagonally away from king and piece is a bishop
+                    # 3.) 1 square away diagonally from king and piece is a pawn
+                    # 4.) any direction and piece is a queen
+                    # 5.) any direction 1 square away and piece is a king
+                    if (j <= 3 and enemyType == ROOK) or (j >= 4 and enemyType == BISHOP) or (
+                            i == 0 and enemyType == PAWN and j in pawnDirections) or (
+                            enemyType == QUEEN) or (i == 0 and enemyType == KING):
+                        if possiblePin == -1:  # no piece blocking, so check
+                            inCheck = True
+                            checks.append((endSquare, j))
+                        else:  # piece blocking so pin
+                            pins[possiblePin] = j
+                    break  # enemy piece blocks anything further away
         # check for knight checks
-        knightMoves = ((-2, -1), (-2, 1), (-1, 2), (1, 2), (2, -1), (2, 1), (-1, -2), (1, -2))
-        for move in knightMoves:
-            endRow = startRow + move[0]
-            endCol = startCol + move[1]
-            if 0 <= endRow <= 7 and 0 <= endCol <= 7:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] == enemyColor and endPiece[1] == "N":  # enemy knight attacking a king
-                    inCheck = True
-                    checks.append((endRow, endCol, move[0], move[1]))
+        enemyKnight = enemyColor | KNIGHT
+        for endSquare in knightTargets[kingSquare]:
+            if squares[endSquare] == enemyKnight:  # enemy knight attacking a king
+                inCheck = True
+                checks.append((endSquare, -1))
         return inCheck, pins, checks
 
 
-    def getPawnMoves(self, row, col, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == row and self.pins[i][1] == col:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
+    def getPawnMoves(self, square, moves):
+        self.getPawnPushes(square, moves)
+        self.getPawnCaptures(square, moves)
+
+    def getPawnPushes(self, square, moves, promotions=True):
+        '''
+        the 1 and 2 square advances; without promotions the advance onto the last rank is left out
+        '''
+        pinDirection = self.pins.get(square, -1)
+        squares = self.squares
 
         if self.whiteToMove:
-            moveAmount = -1
-            startRow = 6
-            enemyColor = "b"
-            kingRow, kingCol = self.whiteKingLocation
+            moveAmount = -8
+            pushDirection = 0
+            startRow, promotionRow = 6, 1
         else:
-            moveAmount = 1
-            startRow = 1
-            enemyColor = "w"
-            kingRow, kingCol = self.blackKingLocation
-
-        if self.board[row + moveAmount][col] == "--":  # 1 square pawn advance
-            if not piecePinned or pinDirection == (moveAmount, 0):
-                moves.append(Move((row, col), (row + moveAmount, col), self.board))
-                if row == startRow and self.board[row + 2 * moveAmount][col] == "--":  # 2 square pawn advance
-                    moves.append(Move((row, col), (row + 2 * moveAmount, col), self.board))
-        if col - 1 >= 0:  # capture to the left
-            if not piecePinned or pinDirection == (moveAmount, -1):
-                if self.board[row + moveAmount][col - 1][0] == enemyColor:
-                    moves.append(Move((row, col), (row + moveAmount, col - 1), self.board))
-                if (row + moveAmount, col - 1) == self.enPassantPossible:
-                    attackingPiece = blockingPiece = False
-                    if kingRow == row:
-                        if kingCol < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            insideRange = range(kingCol + 1, col - 1)
-                            outsideRange = range(col + 1, 8)
-                        else:  # king right of the pawn
-                            insideRange = range(kingCol - 1, col, -1)
-                            outsideRange = range(col - 2, -1, -1)
-                        for i in insideRange:
-                            if self.board[row][i] != "--":  # some piece beside en-passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[row][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((row, col), (row + moveAmount, col - 1), self.board, isEnpassantMove=True))
-        if col + 1 <= 7:  # capture to the right
-            if not piecePinned or pinDirection == (moveAmount, 1):
-                if self.board[row + moveAmount][col + 1][0] == enemyColor:
-                    moves.append(Move((row, col), (row + moveAmount, col + 1), self.board))
-                if (row + moveAmount, col + 1) == self.enPassantPossible:
-                    attackingPiece = blockingPiece = False
-                    if kingRow == row:
-                        if kingCol < col:  # king is left of the pawn
-                            # inside: between king and the pawn;
-                            # outside: between pawn and border;
-                            insideRange = range(kingCol + 1, col)
-                            outsideRange = range(col + 2, 8)
-                        else:  # king right of the pawn
-                            insideRange = range(kingCol - 1, col + 1, -1)
-                            outsideRange = range(col - 1, -1, -1)
-                        for i in insideRange:
-                            if self.board[row][i] != "--":  # some piece beside en-passant pawn blocks
-                                blockingPiece = True
-                        for i in outsideRange:
-                            square = self.board[row][i]
-                            if square[0] == enemyColor and (square[1] == "R" or square[1] == "Q"):
-                                attackingPiece = True
-                            elif square != "--":
-                                blockingPiece = True
-                    if not attackingPiece or blockingPiece:
-                        moves.append(Move((row, col), (row + moveAmount, col + 1), self.board, isEnpassantMove=True))
-            
-    def getRookMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                if self.board[r][c][1] != 'Q':
-                    self.pins.remove(self.pins[i])
-                break
-        directions = ((-1, 0), (0, -1), (1, 0), (0, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8: # on board
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--": # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else: # enemy piece invalid
-                            break
-                else: # off board
+            moveAmount = 8
+            pushDirection = 2
+            startRow, promotionRow = 1, 6
+
+        if not promotions and square >> 3 == promotionRow:
+            return
+        if squares[square + moveAmount] == EMPTY:  # 1 square pawn advance
+            if pinDirection == -1 or pinDirection == pushDirection or oppositeDirection[pinDirection] == pushDirection:
+                self.addPawnMove(square, square + moveAmount, moves)
+                if square >> 3 == startRow and squares[square + 2 * moveAmount] == EMPTY:  # 2 square pawn advance
+                    moves.append(Move(square, square + 2 * moveAmount, squares))
+
+    def getPawnCaptures(self, square, moves, promotionPush=False, underpromotions=True):
+        '''
+        diagonal and en passant captures; with promotionPush also the 1 square advance onto the last rank
+        '''
+        pinDirection = self.pins.get(square, -1)
+        squares = self.squares
+
+        if self.whiteToMove:
+            captures = ((-9, -1, 4), (-7, 1, 5)) # (square offset, column change, direction index) for capturing left and right
+            enemyColor = BLACK
+            kingSquare = self.whiteKingSquare
+            promotionRow, moveAmount, pushDirection = 1, -8, 0
+        else:
+            captures = ((7, -1, 6), (9, 1, 7))
+            enemyColor = WHITE
+            kingSquare = self.blackKingSquare
+            promotionRow, moveAmount, pushDirection = 6, 8, 2
+        col = square & 7
+
+        if promotionPush and square >> 3 == promotionRow and squares[square + moveAmount] == EMPTY:
+            if pinDirection == -1 or pinDirection == pushDirection or oppositeDirection[pinDirection] == pushDirection:
+                self.addPawnMove(square, square + moveAmount, moves, underpromotions)
+        for offset, colChange, captureDirection in captures:
+            endCol = col + colChange
+            if not 0 <= endCol <= 7:
+                continue
+            if pinDirection != -1 and pinDirection != captureDirection and oppositeDirection[pinDirection] != captureDirection:
+                continue
+            endSquare = square + offset
+            if squares[endSquare] & enemyColor:
+                self.addPawnMove(square, endSquare, moves, underpromotions)
+            elif endSquare == self.enPassantSquare:
+                if not self.enPassantExposesKing(square, endCol, kingSquare, enemyColor):
+                    moves.append(Move(square, endSquare, squares, isEnpassantMove=True))
+
+    def addPawnMove(self, square, endSquare, moves, underpromotions=True):
+        # a pawn reaching the last rank promotes, to a queen (listed first) or any of the other pieces
+        if endSquare < 8 or endSquare >= 56:
+            for promotionPiece in ((QUEEN, KNIGHT, ROOK, BISHOP) if underpromotions else (QUEEN,)):
+                moves.append(Move(square, endSquare, self.squares, promotionPiece=promotionPiece))
+        else:
+            moves.append(Move(square, endSquare, self.squares))
+
+    def enPassantExposesKing(self, square, capturedCol, kingSquare, enemyColor):
+        '''
+        capturing en passant takes two pawns off the same rank at once, which can open that rank to a rook or queen
+        '''
+        squares = self.squares
+        if kingSquare >> 3 != square >> 3:
+            return False
+        row = square >> 3
+        kingCol = kingSquare & 7
+        lowCol, highCol = min(square & 7, capturedCol), max(square & 7, capturedCol)
+        # inside: between king and the pawns; outside: between the pawns and the border in the same direction
+        if kingCol < lowCol:
+            insideRange = range(kingCol + 1, lowCol)
+            outsideRange = range(highCol + 1, 8)
+        else:
+            insideRange = range(kingCol - 1, highCol, -1)
+            outsideRange = range(lowCol - 1, -1, -1)
+        for i in insideRange:
+            if squares[row * 8 + i] != EMPTY:  # some piece beside en-passant pawn blocks
+                return False
+        for i in outsideRange:
+            piece = squares[row * 8 + i]
+            if piece != EMPTY:
+                return piece & enemyColor != 0 and piece & TYPE_MASK in (ROOK, QUEEN)
+        return False
+
+    def getRookMoves(self, square, moves):
+        self.getSlidingMoves(square, moves, slidingDirections[ROOK])
+
+    def getBishopMoves(self, square, moves):
+        self.getSlidingMoves(square, moves, slidingDirections[BISHOP])
+
+    def getQueenMoves(self, square, moves):
+        self.getSlidingMoves(square, moves, slidingDirections[QUEEN])
+
+    def getSlidingMoves(self, square, moves, pieceDirections):
+        pinDirection = self.pins.get(square, -1)
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        squareRays = rays[square]
+        for d in pieceDirections:
+            if pinDirection != -1 and pinDirection != d and oppositeDirection[pinDirection] != d:
+                continue # pinned pieces can only move along the pin
+            for endSquare in squareRays[d]:
+                endPiece = squares[endSquare]
+                if endPiece == EMPTY: # empty space valid
+                    moves.append(Move(square, endSquare, squares))
+                else:
+                    if endPiece & enemyColor:
+                        moves.append(Move(square, endSquare, squares))
+                    break # can't move through pieces
+
+    def getSlidingCaptures(self, square, moves, pieceDirections):
+        pinDirection = self.pins.get(square, -1)
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        squareRays = rays[square]
+        for d in pieceDirections:
+            if pinDirection != -1 and pinDirection != d and oppositeDirection[pinDirection] != d:
+                continue # pinned pieces can only move along the pin
+            for endSquare in squareRays[d]:
+                endPiece = squares[endSquare]
+                if endPiece != EMPTY: # only the first piece in each direction can be captured
+                    if endPiece & enemyColor:
+                        moves.append(Move(square, endSquare, squares))
                     break
 
-    def getBishopMoves(self, r, c, moves):
-        piecePinned = False
-        pinDirection = ()
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                pinDirection = (self.pins[i][2], self.pins[i][3])
-                self.pins.remove(self.pins[i])
-                break
-        
-        directions = ((-1, -1), (-1, 1), (1, -1), (1, 1))
-        enemyColor = "b" if self.whiteToMove else "w"
-        for d in directions:
-            for i in range(1, 8):
-                endRow = r + d[0] * i
-                endCol = c + d[1] * i
-                if 0 <= endRow < 8 and 0 <= endCol < 8:
-                    if not piecePinned or pinDirection == d or pinDirection == (-d[0], -d[1]):
-                        endPiece = self.board[endRow][endCol]
-                        if endPiece == "--": # empty space valid
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                        elif endPiece[0] == enemyColor:
-                            moves.append(Move((r, c), (endRow, endCol), self.board))
-                            break
-                        else: # enemy piece invalid
-                            break
-                else: # off board
+    def getSlidingQuiets(self, square, moves, pieceDirections):
+        pinDirection = self.pins.get(square, -1)
+        squares = self.squares
+        squareRays = rays[square]
+        for d in pieceDirections:
+            if pinDirection != -1 and pinDirection != d and oppositeDirection[pinDirection] != d:
+                continue # pinned pieces can only move along the pin
+            for endSquare in squareRays[d]:
+                if squares[endSquare] != EMPTY: # the empty squares up to the first piece
                     break
-    
-    def getKnightMoves(self, r, c, moves):
-        piecePinned = False
-        for i in range(len(self.pins) - 1, -1, -1):
-            if self.pins[i][0] == r and self.pins[i][1] == c:
-                piecePinned = True
-                self.pins.remove(self.pins[i])
-                break
-        knightMoves = ((-2, -1), (-2, 1), (-1, -2), (-1, 2),
-                       (1, -2), (1, 2), (2, -1), (2, 1))
-        allyColor = "w" if self.whiteToMove else "b"
-        for m in knightMoves:
-            endRow = r + m[0]
-            endCol = c + m[1]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                if not piecePinned:
-                    endPiece = self.board[endRow][endCol]
-                    if endPiece[0] != allyColor: #not ally piece (empty or enemy piece
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-
-    def getQueenMoves(self, r, c, moves):
-        self.getRookMoves(r, c, moves)
-        self.getBishopMoves(r, c, moves)
-    
-    def getKingMoves(self, r, c, moves):
-        rowMoves = (-1, -1, -1, 0, 0, 1, 1, 1)
-        colMoves = (-1, 0, 1, -1, 1, -1, 0, 1)
-        allyColor = 'w' if self.whiteToMove else 'b'
-        for i in range(8):
-            endRow = r + rowMoves[i]
-            endCol = c + colMoves[i]
-            if 0 <= endRow < 8 and 0 <= endCol < 8:
-                endPiece = self.board[endRow][endCol]
-                if endPiece[0] != allyColor: #not ally piece (empty or enemy piece
-                    # place king on end square and check for checks
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (endRow, endCol)
-                    else:
-                        self.blackKingLocation = (endRow, endCol)
-                    inCheck, pins, checks = self.checkForPinsAndChecks()
-                    if not inCheck:
-                        moves.append(Move((r, c), (endRow, endCol), self.board))
-                    # place king back on original location
-                    if allyColor == 'w':
-                        self.whiteKingLocation = (r, c)
-                    else:
-                        self.blackKingLocation = (r, c)
-
-    def squareUnderAttack(self, r, c):
-        self.whiteToMove = not self.whiteToMove
-        oppMoves = self.getAllPossibleMoves()
-        self.whiteToMove = not self.whiteToMove
-        for move in oppMoves:
-            if move.endRow == r and move.endCol == c:
+                moves.append(Move(square, endSquare, squares))
+
+    def getKnightMoves(self, square, moves):
+        if square in self.pins: # pinned knights can never move
+            return
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for endSquare in knightTargets[square]:
+            if not squares[endSquare] & allyColor: #not ally piece (empty or enemy piece)
+                moves.append(Move(square, endSquare, squares))
+
+    def getKnightCaptures(self, square, moves):
+        if square in self.pins: # pinned knights can never move
+            return
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        for endSquare in knightTargets[square]:
+            if squares[endSquare] & enemyColor:
+                moves.append(Move(square, endSquare, squares))
+
+    def getKnightQuiets(self, square, moves):
+        if square in self.pins: # pinned knights can never move
+            return
+        squares = self.squares
+        for endSquare in knightTargets[square]:
+            if squares[endSquare] == EMPTY:
+                moves.append(Move(square, endSquare, squares))
+
+    def getKingMoves(self, square, moves, capturesOnly=False, quietsOnly=False):
+        squares = self.squares
+        allyColor = WHITE if self.whiteToMove else BLACK
+        for endSquare in kingTargets[square]:
+            endPiece = squares[endSquare]
+            if not endPiece & allyColor and (endPiece != EMPTY or not capturesOnly) and (endPiece == EMPTY or not quietsOnly): #not ally piece (empty or enemy piece)
+                # the king's current square doesn't block, it could be moving away from a slider along its ray
+                if not self.squareUnderAttack(endSquare, ignoreSquare=square):
+                    moves.append(Move(square, endSquare, squares))
+
+    def squareUnderAttack(self, square, ignoreSquare=-1):
+        '''
+        True if a piece of the opponent of the side to move attacks square. Looks outward from the square along the
+        rays, knight jumps and pawn diagonals instead of generating the opponent's moves.
+        ignoreSquare is treated as empty, for the king's own square when checking where it can move to.
+        '''
+        squares = self.squares
+        enemyColor = BLACK if self.whiteToMove else WHITE
+        enemyKnight = enemyColor | KNIGHT
+        for endSquare in knightTargets[square]:
+            if squares[endSquare] == enemyKnight:
                 return True
+        enemyPawn = enemyColor | PAWN
+        for endSquare in pawnAttackers[enemyColor][square]:
+            if squares[endSquare] == enemyPawn:
+                return True
+        enemyKing = enemyColor | KING
+        for endSquare in kingTargets[square]:
+            if squares[endSquare] == enemyKing:
+                return True
+        enemyQueen = enemyColor | QUEEN
+        squareRays = rays[square]
+        for d in range(8):
+            enemySlider = enemyColor | (ROOK if d <= 3 else BISHOP)
+            for endSquare in squareRays[d]:
+                piece = squares[endSquare]
+                if piece != EMPTY and endSquare != ignoreSquare:
+                    if piece == enemySlider or piece == enemyQueen:
+                        return True
+                    break
         return False
-    
-    
-    def getCastleMoves(self, r, c, moves):
-        if self.squareUnderAttack(r, c):
-            return
-        if (self.whiteToMove and self.currentCastlingRight.wks) or (not self.whiteToMove and self.currentCastlingRight.bks):
-            self.getKingsideCastleMoves(r, c, moves)
-        if (self.whiteToMove and self.currentCastlingRight.wqs) or (not self.whiteToMove and self.currentCastlingRight.bqs):
-            self.getQueensideCastleMoves(r, c, moves)
-    
-    def getKingsideCastleMoves(self, r, c, moves):
-        # Check if the king is within the bounds of the board
-        if 0 <= r < len(self.board) and 0 <= c < len(self.board[0]):
-            # Check if the king is not at the edge of the board
-            if c + 2 < len(self.board[0]):
-                # Check if the squares for castling are empty
-                if self.board[r][c+1] == '--' and self.board[r][c+2] == '--':
-                    # Check if the squares the king moves through are not under attack
-                    if not self.squareUnderAttack(r, c+1) and not self.squareUnderAttack(r, c+2):
-                        moves.append(Move((r, c), (r, c+2), self.board, isCastleMove=True))
-    def getQueensideCastleMoves(self, r, c, moves):
-        if self.board[r][c-1] == '--' and self.board[r][c-2] == '--' and self.board[r][c-3] == '--':
-            if not self.squareUnderAttack(r, c-1) and not self.squareUnderAttack(r, c-2):
-                moves.append(Move((r, c), (r, c-2), self.board, isCastleMove=True))
-
-class CastleRights():
-    def __init__(self, wks, bks, wqs, bqs):
-        self.wks = wks
-        self.bks = bks
-        self.wqs = wqs
-        self.bqs = bqs
+
+    def getCastleMoves(self, square, moves):
+        # only called when not in check
+        if self.whiteToMove:
+            if self.castleRights & WKS:
+                self.getKingsideCastleMoves(square, moves)
+            if self.castleRights & WQS:
+                self.getQueensideCastleMoves(square, moves)
+        else:
+            if self.castleRights & BKS:
+                self.getKingsideCastleMoves(square, moves)
+            if self.castleRights & BQS:
+                self.getQueensideCastleMoves(square, moves)
+
+    def getKingsideCastleMoves(self, square, moves):
+        # Check if the squares for castling are empty
+        if self.squares[square + 1] == EMPTY and self.squares[square + 2] == EMPTY:
+            # Check if the squares the king moves through are not under attack
+            if not self.squareUnderAttack(square + 1) and not self.squareUnderAttack(square + 2):
+                moves.append(Move(square, square + 2, self.squares, isCastleMove=True))
+
+    def getQueensideCastleMoves(self, square, moves):
+        if self.squares[square - 1] == EMPTY and self.squares[square - 2] == EMPTY and self.squares[square - 3] == EMPTY:
+            if not self.squareUnderAttack(square - 1) and not self.squareUnderAttack(square - 2):
+                moves.append(Move(square, square - 2, self.squares, isCastleMove=True))
 
 class Move():
     # maps keys to values
@@ -537,31 +1000,65 @@ class Move():
                    "e": 4, "f": 5, "g": 6, "h": 7}
     colsToFiles = {v: k for k, v in filesToCols.items()}
 
-    def __init__(self, startSq, endSq, board, isEnpassantMove=False, isCastleMove=False):
-        self.startRow = startSq[0]
-        self.startCol = startSq[1]
-        self.endRow = endSq[0]
-        self.endCol = endSq[1]
-        self.pieceMoved = board[self.startRow][self.startCol]
-        self.pieceCaptured = board[self.endRow][self.endCol]
-        self.isPawnPromotion = (self.pieceMoved == 'wp' and self.endRow == 0) or (self.pieceMoved == 'bp' and self.endRow == 7)
+    # the search creates hundreds of thousands of moves: slots instead of a per-object __dict__, and the
+    # row/col of the squares are only worked out when asked for (GUI, notation)
+    __slots__ = ("startSq", "endSq", "pieceMoved", "pieceCaptured", "isPawnPromotion", "promotionPiece", "isenPassantMove", "isCastleMove", "moveID")
+
+    def __init__(self, startSq, endSq, squares, isEnpassantMove=False, isCastleMove=False, promotionPiece=QUEEN):
+        # startSq and endSq are square indices (row * 8 + col), squares is GameState.squares
+        self.startSq = startSq
+        self.endSq = endSq
+        self.pieceMoved = pieceMoved = squares[startSq]
+        self.isPawnPromotion = pieceMoved & TYPE_MASK == PAWN and (endSq < 8 or endSq >= 56)
+        self.promotionPiece = promotionPiece # piece type a promoting pawn turns into
         #en passant
         self.isenPassantMove = isEnpassantMove
-        if self.isenPassantMove:
-            self.pieceCaptured = 'wp' if self.pieceMoved == 'bp' else 'bp'
-        
+        if isEnpassantMove:
+            self.pieceCaptured = WHITE | PAWN if pieceMoved == BLACK | PAWN else BLACK | PAWN
+        else:
+            self.pieceCaptured = squares[endSq]
+
         #castling
         self.isCastleMove = isCastleMove
-        
-        self.moveID = self.startRow * 1000 + self.startCol * 100 + self.endRow * 10 + self.endCol
-    
+
+        # from and to square packed in 12 bits, plus the promotion piece above them for under-promotions
+        # (promoting to a queen keeps the plain id, that's what the GUI plays)
+        self.moveID = startSq << 6 | endSq
+        if promotionPiece != QUEEN and self.isPawnPromotion:
+            self.moveID |= promotionPiece << 12
+
+    @property
+    def startRow(self):
+        return self.startSq >> 3
+
+    @property
+    def startCol(self):
+        return self.startSq & 7
+
+    @property
+    def endRow(self):
+        return self.endSq >> 3
+
+    @property
+    def endCol(self):
+        return self.endSq & 7
+
     def __eq__(self, other):
         if isinstance(other, Move):
             return self.moveID == other.moveID
         return False
-    
+
+    def __hash__(self):
+        return self.moveID
+
+    def __repr__(self):
+        return "Move(%s)" % self.getChessNotation()
+
     def getChessNotation(self):
-        return self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
-    
+        notation = self.getRankFile(self.startRow, self.startCol) + self.getRankFile(self.endRow, self.endCol)
+        if self.isPawnPromotion:
+            notation += pieceNames[BLACK | self.promotionPiece][1].lower()
+        return notation
+
     def getRankFile(self, r, c):
-        return self.colsToFiles[c] + self.rowsToRanks[r]
\ No newline at end of file
+        return self.colsToFiles[c] + self.rowsToRanks[r]
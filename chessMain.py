@@ -5,7 +5,7 @@ This is the main driver file for the chess game. It will be responsible for hand
 import pygame as p
 from chessEngine import *
 from smartMoveFinder import *
-from multiprocessing import Process, Queue
+from engineWorker import EngineWorker
 import sys
 
 WIDTH = HEIGHT = 512 
@@ -22,88 +22,98 @@ def loadImages():
 
 
 def drawGameState(screen, gs, validMoves, sqSelected):
-    drawBoard(screen)
-    highlightSquares(screen, gs, validMoves, sqSelected)
-    drawPieces(screen, gs, validMoves, sqSelected)
-
-# Draws the squares on the board
-def drawBoard(screen):
-    global colors
-    colors = [p.Color(160, 108, 88), p.Color(255,229,204)]
-    for row in range(DIMENSION):
-        for col in range(DIMENSION):
-            color = colors[((row + col) % 2)]
-            p.draw.rect(screen, color, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    for square, squareState in enumerate(squareView(gs, validMoves, sqSelected)):
+        drawSquare(screen, square, squareState)
+
+# the empty board and the selected square overlay are drawn once and then only blitted
+colors = [p.Color(160, 108, 88), p.Color(255,229,204)]
+boardSurface = None
+selectionSurface = None
 
-def drawPieces(screen, gs, validMoves, sqSelected):
-    ''' Draws the pieces on the board '''
+def loadBoardSurfaces():
+    global boardSurface, selectionSurface
+    boardSurface = p.Surface((WIDTH, HEIGHT))
     for row in range(DIMENSION):
         for col in range(DIMENSION):
-            piece = gs.board[row][col]
-            if piece != "--":
-                screen.blit(IMAGES[piece], p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-
-    # Draw dots for valid moves
-    if sqSelected:
-        for move in validMoves:
-            if move.startRow == sqSelected[0] and move.startCol == sqSelected[1]:
-                end_square_center = (move.endCol * SQ_SIZE + SQ_SIZE // 2, move.endRow * SQ_SIZE + SQ_SIZE // 2)
-                p.draw.circle(screen, (100, 100, 50), end_square_center, SQ_SIZE // 10)
-
+            color = colors[((row + col) % 2)]
+            p.draw.rect(boardSurface, color, p.Rect(col * SQ_SIZE, row * SQ_SIZE, SQ_SIZE, SQ_SIZE))
+    selectionSurface = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA)  # Make surface transparent
+    selectionSurface.fill((200, 200, 100, 100))  # Fill with a lighter shade of board color
 
 '''
-Highlight square selected and moves for piece
+What each square shows as (piece, selected, check ring, move dot): the selected square is highlighted if it holds a
+piece of the side to move, with a dot on every square that piece can move to and a red ring if it is the king in check.
+The main loop compares the view with the one of the last frame and only redraws the squares that changed
 '''
-def highlightSquares(screen, gs, validMoves, sqSelected):
+def squareView(gs, validMoves, sqSelected):
+    selectedSquare = checkSquare = None
+    targets = set()
     if sqSelected != ():
         r, c = sqSelected
+        targets = {move.endSq for move in validMoves if move.startRow == r and move.startCol == c}
         if gs.board[r][c][0] == ('w' if gs.whiteToMove else 'b'):
-            # Highlight selected square
-            s = p.Surface((SQ_SIZE, SQ_SIZE), p.SRCALPHA)  # Make surface transparent
-            s.fill((200, 200, 100, 100))  # Fill with a lighter shade of board color
-            screen.blit(s, (c*SQ_SIZE, r*SQ_SIZE))
-            # Highlight moves from that square with a dot
-            for move in validMoves:
-                if move.startRow == r and move.startCol == c:
-                    end_square_center = (move.endCol * SQ_SIZE + SQ_SIZE // 2, move.endRow * SQ_SIZE + SQ_SIZE // 2)
-                    p.draw.circle(screen, (100, 100, 50), end_square_center, SQ_SIZE // 10)  # Draw dot with darker shade
-
-            if gs.inCheck:
-                kingRow, kingCol = gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation
-                if (kingRow, kingCol) == (r, c):
-                    p.draw.rect(screen, p.Color("red"), p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE), 3)
+            selectedSquare = squareIndex(r, c)
+            if gs.inCheck and (r, c) == (gs.whiteKingLocation if gs.whiteToMove else gs.blackKingLocation):
+                checkSquare = selectedSquare
+    return [(pieceNames[gs.squares[square]], square == selectedSquare, square == checkSquare, square in targets) for square in range(64)]
+
+def drawSquare(screen, square, squareState):
+    ''' Draws one square with what is on it, returns its rect '''
+    if boardSurface is None:
+        loadBoardSurfaces()
+    piece, selected, checkRing, moveDot = squareState
+    rect = p.Rect((square & 7) * SQ_SIZE, (square >> 3) * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    screen.blit(boardSurface, rect, rect)
+    if selected:
+        screen.blit(selectionSurface, rect)
+    if checkRing:
+        p.draw.rect(screen, p.Color("red"), rect, 3)
+    if piece != "--":
+        screen.blit(IMAGES[piece], rect)
+    if moveDot:
+        p.draw.circle(screen, (100, 100, 50), rect.center, SQ_SIZE // 10)
+    return rect
+
+def drawChangedSquares(screen, view, lastView):
+    ''' Redraws the squares that look different from lastView (all of them if it is None), returns their rects '''
+    return [drawSquare(screen, square, squareState) for square, squareState in enumerate(view) if lastView is None or squareState != lastView[square]]
 
 '''
 Animate move
 '''
 def animateMove(move, screen, board, clock, validMoves, sqSelected):
-    global colors
-    coords = []  # list of coordinates that the animation will move through
     dR = move.endRow - move.startRow
     dC = move.endCol - move.startCol
-    distance = max(abs(dR), abs(dC))  # Calculate maximum distance to determine framesPerSquare
     framesPerSquare = 10  # Default frames to move one square
 
     # Calculate the duration based on the longest distance
     frameCount = framesPerSquare * max(abs(dR), abs(dC))
 
+    # the position after the move with the piece moved not drawn yet, only the squares it slides over are redrawn
+    background = p.Surface((WIDTH, HEIGHT))
+    drawGameState(background, board, validMoves, sqSelected)
+    endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+    background.blit(boardSurface, endSquare, endSquare)
+    # draw captured piece onto rectangle
+    if move.pieceCaptured != EMPTY:
+        if move.isenPassantMove:
+            enPassantRow = (move.endRow + 1) if move.pieceCaptured & BLACK else move.endRow - 1
+            endSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        background.blit(IMAGES[pieceNames[move.pieceCaptured]], endSquare)
+    screen.blit(background, (0, 0))
+    lastRect = None
     for frame in range(frameCount + 1):
         r = move.startRow + dR * frame / frameCount
         c = move.startCol + dC * frame / frameCount
-        drawBoard(screen)
-        drawPieces(screen, board, validMoves, sqSelected)
-        # erase the piece moved from its ending square
-        color = colors[(move.endRow + move.endCol) % 2]
-        endSquare = p.Rect(move.endCol * SQ_SIZE, move.endRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-        p.draw.rect(screen, color, endSquare)
-        # draw captured piece onto rectangle
-        if move.pieceCaptured != '--':
-            if move.isenPassantMove:
-                enPassantRow = (move.endRow + 1) if move.pieceCaptured[0] == 'b' else move.endRow - 1
-                endSquare = p.Rect(move.endCol * SQ_SIZE, enPassantRow * SQ_SIZE, SQ_SIZE, SQ_SIZE)
-            screen.blit(IMAGES[move.pieceCaptured], endSquare)
-        screen.blit(IMAGES[move.pieceMoved], p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE))
-        p.display.flip()
+        pieceRect = p.Rect(c * SQ_SIZE, r * SQ_SIZE, SQ_SIZE, SQ_SIZE)
+        if lastRect is not None:
+            screen.blit(background, lastRect, lastRect)
+        screen.blit(IMAGES[pieceNames[move.pieceMoved]], pieceRect)
+        if lastRect is None:
+            p.display.flip()
+        else:
+            p.display.update([lastRect, pieceRect])
+        lastRect = pieceRect
         clock.tick(60)
 
 def drawText(screen, text):
@@ -113,6 +123,7 @@ def drawText(screen, text):
     screen.blit(textObject, textLocation)
     textObject = font.render(text, 0, p.Color('Gray'))
     screen.blit(textObject, textLocation.move(2, 2))
+    return p.Rect(textLocation.topleft, (textObject.get_width() + 2, textObject.get_height() + 2))
 
 def main():
     p.init()
@@ -125,6 +136,7 @@ def main():
     moveMade = False
     animate = False # flag variable for when we need to animate a move
     loadImages() # only do this once, before the while loop
+    loadBoardSurfaces()
     moveSound = p.mixer.Sound('assets/move.mp3')
     p.display.set_icon(IMAGES['bK'])
     running = True
@@ -134,15 +146,20 @@ def main():
     playerOne = True # if a human is playing white, then this will be true
     playerTwo = False # if a human is playing black, then this will be true
     AIThinking = False
-    moveFinderProcess = None
+    engine = EngineWorker() # one search process for the whole game, started once
     moveUndone = False
+    lastView = None # what the squares on screen show, None when the whole window needs drawing
+    lastText = None
     while running:
         humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
         for e in p.event.get():
             if e.type == p.QUIT:
                 running = False
+                engine.close()
                 p.quit()
                 sys.exit()
+            elif e.type == p.VIDEOEXPOSE: # the window was covered or restored
+                lastView = None
             
             # mouse handler
             elif e.type == p.MOUSEBUTTONDOWN:
@@ -157,7 +174,7 @@ def main():
                         sqSelected = (row, col)
                         playerClicks.append(sqSelected) # append for both 1st and 2nd click
                     if len(playerClicks) == 2 and humanTurn: # after 2nd click
-                        move = Move(playerClicks[0], playerClicks[1], gs.board)
+                        move = Move(squareIndex(*playerClicks[0]), squareIndex(*playerClicks[1]), gs.squares)
                         print(move.getChessNotation())
                         for i in range(len(validMoves)):
                             if move == validMoves[i]:
@@ -178,9 +195,12 @@ def main():
                     animate = False
                     gameOver = False
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        engine.cancel()
                         AIThinking = False
+                    engine.stopPondering()
                     moveUndone = True
+                if e.key == p.K_m and AIThinking: # the computer moves now, with what it has found so far
+                    engine.moveNow()
                 if e.key == p.K_r:
                     gs = GameState()
                     validMoves = gs.getValidMoves()
@@ -190,8 +210,9 @@ def main():
                     animate = False
                     gameOver = False #Reset gameFlag
                     if AIThinking:
-                        moveFinderProcess.terminate()
+                        engine.cancel()
                         AIThinking = False
+                    engine.stopPondering()
                     moveUndone = True
         
         # AI move finder logic
@@ -199,13 +220,12 @@ def main():
             if not AIThinking:
                 AIThinking = True
                 print("thinking....")
-                returnQueue = Queue() # used to pass data between processes/ threads
-                moveFinderProcess = Process(target= findBestMove, args=(gs, validMoves, returnQueue))
-                moveFinderProcess.start() # starting the process
-                
-            if not moveFinderProcess.is_alive():
+                if engine.startSearch(gs): # sends only the moves made since the last search
+                    print("ponder hit")
+
+            if engine.resultReady():
                 print('DOne thinking!!!') 
-                AIMove = returnQueue.get()   
+                AIMove = engine.getResult(validMoves)
                 if AIMove is None:
                     AIMove = findRandomMove(validMoves)
                 gs.makeMove(AIMove)
@@ -217,25 +237,43 @@ def main():
         if moveMade:
             if animate:
                 animateMove(gs.moveLog[-1], screen, gs, clock, validMoves, sqSelected)
+                lastView = None
             validMoves = gs.getValidMoves()
             moveMade = False
             animate = False
             moveUndone = False
 
-        drawGameState(screen, gs, validMoves, sqSelected)
-        
+        # think on the human's time when the computer plays the other side
+        humanTurn = (gs.whiteToMove and playerOne) or (not gs.whiteToMove and playerTwo)
+        if not gameOver and humanTurn and not (playerOne and playerTwo) and not engine.pondering and not moveUndone:
+            engine.ponder(gs, validMoves)
+
+        text = None
         if gs.checkmate:
             gameOver = True
             if gs.whiteToMove:
-                drawText(screen, "Black wins by checkmate")
+                text = "Black wins by checkmate"
             else:
-                drawText(screen, "White wins by checkmate")
+                text = "White wins by checkmate"
         elif gs.stalemate:
             gameOver = True
-            drawText(screen, "Stalemate")
+            text = "Stalemate"
+
+        # only what changed since the last frame is drawn, nothing at all while the position and selection stay the same
+        if lastText is not None and text != lastText:
+            lastView = None # the squares under the old text
+        fullRedraw = lastView is None
+        view = squareView(gs, validMoves, sqSelected)
+        dirtyRects = drawChangedSquares(screen, view, lastView)
+        if text is not None and (dirtyRects or text != lastText):
+            dirtyRects.append(drawText(screen, text))
+        if fullRedraw:
+            p.display.flip()
+        elif dirtyRects:
+            p.display.update(dirtyRects)
+        lastView, lastText = view, text
 
         clock.tick(MAX_FPS)
-        p.display.flip()
 
 if __name__ == "__main__":
     main()
\ No newline at end of file
@@ -0,0 +1,211 @@
+"""
+Long lived search process for the GUI. Instead of pickling the whole GameState into a new Process for every AI move, the
+worker keeps its own GameState in sync from the moves played and undone (sent as move ids), and its transposition
+table stays warm from one search to the next. Commands and results go over a Pipe.
+While the human thinks the worker ponders: it searches the position after the reply it expects, so when the human
+plays that move the search has a head start (or is already done), and any other move finds the table warmed up.
+Searches are stopped by a message rather than by killing the process: the worker polls the pipe while it searches and
+answers a stop with the best move of its deepest completed iteration, which the GUI plays (move now) or drops (undo).
+"""
+import time
+from multiprocessing import Pipe, Process
+
+from chessEngine import GameState
+import smartMoveFinder
+
+
+def playMoveID(gs, moveID):
+    for move in gs.getValidMoves():
+        if move.moveID == moveID:
+            gs.makeMove(move)
+            return
+    raise ValueError("move id %d is not legal in the worker's position" % moveID)
+
+
+def bestMoveMessage(searcher, gs, bestMove):
+    # the expected reply is the second move of the principal variation, what the worker ponders on next
+    if bestMove is None:
+        return ("bestmove", None, None)
+    pv = searcher.principalVariation(gs, bestMove, 2)
+    return ("bestmove", bestMove.moveID, pv[1].moveID if len(pv) > 1 else None)
+
+
+class SearchStop():
+    '''
+    stopEvent of the worker's searches, polled by the search: set when a message comes from the GUI. Except for
+    "ponderhit" (the human played the expected move), which turns a ponder search into a normal one with the usual
+    time limit
+    '''
+    def __init__(self, connection, searcher):
+        self.connection = connection
+        self.searcher = searcher
+        self.hit = False
+        self.message = None # the message that stopped the search, still to be handled
+
+    def is_set(self):
+        if self.message is None and self.connection.poll():
+            message = self.connection.recv()
+            if message[0] == "ponderhit" and not self.hit:
+                self.hit = True
+                self.searcher.stopTime = time.time() + smartMoveFinder.TIME_LIMIT
+            else:
+                self.message = message
+        return self.message is not None
+
+
+def ponder(searcher, gs, connection, moveID):
+    '''
+    searches the position after the expected reply moveID (or gs itself when there is none) until a message comes, and
+    answers with the best move if it was a ponderhit. Returns the message still to be handled, if any
+    '''
+    if moveID is not None:
+        playMoveID(gs, moveID)
+    stop = SearchStop(connection, searcher)
+    bestMove = searcher.findBestMove(gs, gs.getValidMoves(), smartMoveFinder.SearchLimits(timeLimit=None, stopEvent=stop))
+    message = stop.message
+    if not stop.hit and message is None: # the search finished before the human moved
+        message = connection.recv()
+        if message[0] == "ponderhit" and moveID is not None:
+            stop.hit = True
+            message = None
+    if stop.hit:
+        connection.send(bestMoveMessage(searcher, gs, bestMove))
+    elif moveID is not None: # ponder miss: back to the position the GUI knows about
+        gs.undoMove()
+    return message
+
+
+def workerLoop(connection):
+    '''
+    runs in the worker process, messages are tuples:
+        ("sync", undoCount, moveIDs)  undo that many moves, then play these
+        ("search",)                   find the best move, answers ("bestmove", moveID or None, expected reply moveID or None).
+                                      Any message stops the search, which still answers with its best move so far
+        ("ponder", moveID or None)    search after the expected reply until the next message. ("ponderhit",) means the
+                                      reply was played: answers as "search" does. Anything else abandons the ponder search
+        ("stop",)                     only stops a search or pondering
+        ("quit",)
+    '''
+    gs = GameState()
+    searcher = smartMoveFinder.Searcher()
+    message = connection.recv()
+    while True:
+        command = message[0]
+        nextMessage = None
+        if command == "sync":
+            undoCount, moveIDs = message[1], message[2]
+            for i in range(undoCount):
+                gs.undoMove()
+            for moveID in moveIDs:
+                playMoveID(gs, moveID)
+        elif command == "search":
+            stop = SearchStop(connection, searcher)
+            bestMove = searcher.findBestMove(gs, gs.getValidMoves(), smartMoveFinder.SearchLimits(stopEvent=stop))
+            connection.send(bestMoveMessage(searcher, gs, bestMove))
+            nextMessage = stop.message
+        elif command == "ponder":
+            nextMessage = ponder(searcher, gs, connection, message[1])
+        elif command == "quit":
+            break
+        message = nextMessage if nextMessage is not None else connection.recv()
+
+
+class EngineWorker():
+    def __init__(self):
+        self.start()
+
+    def start(self):
+        self.connection, workerConnection = Pipe()
+        self.process = Process(target=workerLoop, args=(workerConnection,), daemon=True)
+        self.process.start()
+        self.syncedMoveIDs = [] # the moves the worker's GameState has played from the start position
+        self.searching = False # a bestmove answer is still to come
+        self.expectedReply = None # moveID of the reply the last search expects
+        self.pondering = False
+        self.ponderMoveID = None
+
+    def sync(self, gs):
+        '''
+        brings the worker's position up to gs by sending only what changed: moves undone and moves played since last time
+        '''
+        moveIDs = [move.moveID for move in gs.moveLog]
+        common = 0
+        while common < len(moveIDs) and common < len(self.syncedMoveIDs) and moveIDs[common] == self.syncedMoveIDs[common]:
+            common += 1
+        undoCount = len(self.syncedMoveIDs) - common
+        if undoCount or common < len(moveIDs):
+            self.connection.send(("sync", undoCount, moveIDs[common:]))
+        self.syncedMoveIDs = moveIDs
+
+    def startSearch(self, gs):
+        '''
+        returns True on a ponder hit: the worker has been searching this position on the human's time
+        '''
+        moveIDs = [move.moveID for move in gs.moveLog]
+        hit = self.ponderMoveID is not None and moveIDs == self.syncedMoveIDs + [self.ponderMoveID]
+        if hit:
+            self.connection.send(("ponderhit",))
+            self.syncedMoveIDs = moveIDs
+        else:
+            self.sync(gs) # stops a ponder search, if there is one
+            self.connection.send(("search",))
+        self.searching = True
+        self.pondering = False
+        self.ponderMoveID = None
+        return hit
+
+    def ponder(self, gs, validMoves):
+        '''
+        starts thinking on the human's time, about the reply the last search expects or, if it isn't a legal move of gs,
+        about gs itself, which still warms up the transposition table for every reply
+        '''
+        self.sync(gs)
+        self.ponderMoveID = self.expectedReply if self.expectedReply in [move.moveID for move in validMoves] else None
+        self.expectedReply = None
+        self.connection.send(("ponder", self.ponderMoveID))
+        self.pondering = True
+
+    def stopPondering(self):
+        if self.pondering:
+            self.connection.send(("stop",))
+            self.pondering = False
+            self.ponderMoveID = None
+
+    def resultReady(self):
+        return self.connection.poll()
+
+    def getResult(self, validMoves):
+        '''
+        the move found by the search, as the matching object from validMoves (None if the search found nothing)
+        '''
+        command, moveID, self.expectedReply = self.connection.recv()
+        self.searching = False
+        for move in validMoves:
+            if move.moveID == moveID:
+                return move
+        return None
+
+    def moveNow(self):
+        '''
+        asks a running search for its move right away: the best one of the deepest iteration it completed, which comes
+        in through resultReady and getResult as usual
+        '''
+        if self.searching:
+            self.connection.send(("stop",))
+
+    def cancel(self):
+        '''
+        abandons a running search: stops it and drops its move. The worker keeps its position and transposition table
+        '''
+        if self.searching:
+            self.connection.send(("stop",))
+            self.connection.recv() # the search answers within a few milliseconds
+            self.searching = False
+        self.expectedReply = None
+
+    def close(self):
+        if self.process.is_alive():
+            self.connection.send(("quit",))
+            self.process.join(timeout=1)
+            if self.process.is_alive():
+                self.process.terminate()
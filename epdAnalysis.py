@@ -0,0 +1,156 @@
+"""
+Batch analysis of EPD files. The input is read line by line and every position is searched under the same budget by a
+pool of worker processes. Each result is written as soon as it (and every line before it) is done, so files with tens
+of thousands of positions stream through without being loaded into memory. Run from the project directory:
+    python epdAnalysis.py positions.epd [-o results.epd] [--workers 4] [--depth N | --movetime MS | --nodes N]
+Every output line is the input line plus the analysis: acd (depth), acn (nodes), acs (seconds), ce (centipawns for the
+side to move), pm (predicted move) and pv. Positions with bm or am operations are counted as solved or not.
+"""
+import argparse
+import collections
+import os
+import sys
+import time
+from multiprocessing import Pool
+
+from chessEngine import GameState
+import smartMoveFinder
+
+
+def parseEpd(line):
+    '''
+    splits an EPD line into a FEN string and a list of (opcode, operand) operations, operands as written.
+    Move counters come from the hmvc and fmvn operations, or from two numbers after the fourth field (a full FEN)
+    '''
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        raise ValueError("an EPD line needs at least 4 fields: %r" % line)
+    rest = fields[4] if len(fields) > 4 else ""
+    counters = rest.split(None, 2)
+    if len(counters) >= 2 and counters[0].isdigit() and counters[1].rstrip(";").isdigit():
+        halfmoveClock, fullmoveNumber = counters[0], counters[1].rstrip(";")
+        rest = counters[2] if len(counters) > 2 else ""
+    else:
+        halfmoveClock, fullmoveNumber = "0", "1"
+    operations = []
+    operation = ""
+    inQuotes = False
+    for char in rest: # operations end at ';' outside of quoted strings
+        if char == '"':
+            inQuotes = not inQuotes
+        if char == ";" and not inQuotes:
+            if operation.strip():
+                opcode, _, operand = operation.strip().partition(" ")
+                operations.append((opcode, operand.strip()))
+            operation = ""
+        else:
+            operation += char
+    if operation.strip():
+        opcode, _, operand = operation.strip().partition(" ")
+        operations.append((opcode, operand.strip()))
+    for opcode, operand in operations:
+        if opcode == "hmvc":
+            halfmoveClock = operand
+        elif opcode == "fmvn":
+            fullmoveNumber = operand
+    return " ".join(fields[:4] + [halfmoveClock, fullmoveNumber]), operations
+
+
+def analysePosition(line, maxDepth, timeLimit, nodeLimit):
+    '''
+    runs in a pool process: searches the position of an EPD line, returns (output line, solved) where solved is
+    None when the line has no bm/am operation to check against. A line that can't be analysed gets a c9 comment
+    with the error instead, so one bad position doesn't end the run
+    '''
+    try:
+        return searchEpdLine(line, maxDepth, timeLimit, nodeLimit)
+    except Exception as e:
+        error = str(e) if isinstance(e, ValueError) else "%s: %s" % (type(e).__name__, e)
+        return line + ' c9 "%s";' % error.replace('"', "'"), None
+
+
+def searchEpdLine(line, maxDepth, timeLimit, nodeLimit):
+    fen, operations = parseEpd(line)
+    gs = GameState(fen)
+    validMoves = gs.getValidMoves()
+    if not validMoves:
+        return line + " c9 \"no legal moves\";", None
+    smartMoveFinder.newGame() # positions are unrelated, every one gets the same cold start
+    start = time.time()
+    best = smartMoveFinder.analyse(gs, maxDepth, timeLimit, nodeLimit)[0]
+    seconds = time.time() - start
+    bestMove, depth, score, pv = best.move, best.depth, best.score, best.pv
+    sans = []
+    for move in pv:
+        sans.append(gs.getSan(move))
+        gs.makeMove(move)
+    for move in pv:
+        gs.undoMove()
+    result = line.rstrip().rstrip(";") + ";" if operations else line.rstrip()
+    result += ' acd %d; acn %d; acs %.2f; ce %d; pm %s; pv "%s";' % (depth, smartMoveFinder.searcher.nodeCount, seconds, round(score * 100), sans[0], " ".join(sans))
+    # bm: the best move(s), the search has to find one of them. am: moves to avoid
+    checks = [(bestMove in [gs.getMoveFromSan(san) for san in operand.split()]) == (opcode == "bm") for opcode, operand in operations if opcode in ("bm", "am")]
+    return result, all(checks) if checks else None
+
+
+def analyseFile(inputFile, outputFile, workers, maxDepth, timeLimit, nodeLimit):
+    '''
+    keeps at most 2 positions per worker in flight and writes results in input order, returns (positions, solved, checked)
+    '''
+    positions = solved = checked = 0
+    pending = collections.deque()
+    def writeResult(result):
+        nonlocal positions, solved, checked
+        line, isSolved = result.get()
+        outputFile.write(line + "\n")
+        outputFile.flush()
+        positions += 1
+        if isSolved is not None:
+            checked += 1
+            solved += isSolved
+    with Pool(workers) as pool:
+        for line in inputFile:
+            line = line.strip()
+            if not line or line.startswith("#"):
+                continue
+            pending.append(pool.apply_async(analysePosition, (line, maxDepth, timeLimit, nodeLimit)))
+            if len(pending) >= 2 * workers:
+                writeResult(pending.popleft())
+        while pending:
+            writeResult(pending.popleft())
+    return positions, solved, checked
+
+
+def main():
+    parser = argparse.ArgumentParser(description="analyse every position of an EPD file")
+    parser.add_argument("input", help="EPD file, - for stdin")
+    parser.add_argument("-o", "--output", help="file to write the results to (default: stdout)")
+    parser.add_argument("--workers", type=int, default=os.cpu_count(), help="processes analysing positions (default: one per core)")
+    parser.add_argument("--depth", type=int, help="search depth per position")
+    parser.add_argument("--movetime", type=int, help="milliseconds per position")
+    parser.add_argument("--nodes", type=int, help="nodes per position")
+    args = parser.parse_args()
+    if args.depth is None and args.movetime is None and args.nodes is None:
+        maxDepth, timeLimit = None, smartMoveFinder.TIME_LIMIT # same as a move in the GUI
+    else:
+        maxDepth = args.depth if args.depth is not None else smartMoveFinder.MAX_PLY - 1
+        timeLimit = args.movetime / 1000 if args.movetime is not None else None
+
+    inputFile = sys.stdin if args.input == "-" else open(args.input)
+    outputFile = open(args.output, "w") if args.output else sys.stdout
+    start = time.time()
+    try:
+        positions, solved, checked = analyseFile(inputFile, outputFile, max(1, args.workers), maxDepth, timeLimit, args.nodes)
+    finally:
+        if inputFile is not sys.stdin:
+            inputFile.close()
+        if outputFile is not sys.stdout:
+            outputFile.close()
+    summary = "%d positions in %.1fs" % (positions, time.time() - start)
+    if checked:
+        summary += ", %d of %d solved" % (solved, checked)
+    print(summary, file=sys.stderr)
+
+
+if __name__ == "__main__":
+    main()
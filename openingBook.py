@@ -0,0 +1,177 @@
+"""
+Opening book: the moves played from a position in a collection of games, looked up by the zobrist key of the position
+(GameState.zobristKey). The file is an array of fixed size records sorted by key, so it is memory mapped and binary
+searched with nothing to parse when it is opened. Run from the project directory:
+    python openingBook.py build games.pgn [more.pgn ...] [-o assets/book.bin] [--plies 20] [--min-weight 1]
+    python openingBook.py probe [--fen "<FEN>"] [--moves e2e4 e7e5 ...]
+"""
+import argparse
+import mmap
+import os
+import random
+import re
+import struct
+import sys
+
+from chessEngine import GameState
+
+BOOK_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "assets", "book.bin")
+RECORD = struct.Struct(">QHH") # zobrist key, Move.moveID, weight
+MAX_WEIGHT = 0xFFFF
+RESULT_WEIGHTS = {"1-0": (2, 0), "0-1": (0, 2), "1/2-1/2": (1, 1), "*": (1, 1)} # (white's moves, black's moves)
+
+
+class OpeningBook():
+    def __init__(self, path=BOOK_PATH):
+        # a missing or empty file is an empty book
+        self.data = None
+        self.size = 0
+        if os.path.exists(path) and os.path.getsize(path) >= RECORD.size:
+            with open(path, "rb") as bookFile:
+                self.data = mmap.mmap(bookFile.fileno(), 0, access=mmap.ACCESS_READ)
+            self.size = len(self.data) // RECORD.size
+
+    def getEntries(self, key):
+        '''
+        [(moveID, weight)] stored for the position with this zobrist key
+        '''
+        low, high = 0, self.size
+        while low < high: # first record with a key >= key
+            middle = (low + high) // 2
+            if RECORD.unpack_from(self.data, middle * RECORD.size)[0] < key:
+                low = middle + 1
+            else:
+                high = middle
+        entries = []
+        while low < self.size:
+            recordKey, moveID, weight = RECORD.unpack_from(self.data, low * RECORD.size)
+            if recordKey != key:
+                break
+            entries.append((moveID, weight))
+            low += 1
+        return entries
+
+    def getMoves(self, gs, validMoves):
+        '''
+        [(move, weight)] the book moves of the position, only ones that are legal in it
+        '''
+        weights = dict(self.getEntries(gs.zobristKey))
+        return [(move, weights[move.moveID]) for move in validMoves if weights.get(move.moveID)]
+
+    def pickMove(self, gs, validMoves):
+        '''
+        a book move chosen at random with a probability proportional to its weight, None when the position is out of book
+        '''
+        bookMoves = self.getMoves(gs, validMoves)
+        if not bookMoves:
+            return None
+        return random.choices([move for move, weight in bookMoves], weights=[weight for move, weight in bookMoves])[0]
+
+
+def readPgnGames(pgnFile):
+    '''
+    yields (tags, sans) for every game of a PGN file: the tag pairs as a dict and the moves of the main line,
+    without comments, variations, annotations and move numbers
+    '''
+    tags = {}
+    movetext = []
+    for line in pgnFile:
+        line = line.strip()
+        if line.startswith("["):
+            if movetext:
+                yield tags, parseMovetext(" ".join(movetext))
+                tags, movetext = {}, []
+            match = re.match(r'\[(\w+)\s+"(.*)"\]', line)
+            if match:
+                tags[match.group(1)] = match.group(2)
+        elif line and not line.startswith("%"):
+            movetext.append(line)
+    if movetext:
+        yield tags, parseMovetext(" ".join(movetext))
+
+
+def parseMovetext(text):
+    text = re.sub(r"\{[^}]*\}|;[^\n]*", " ", text)
+    mainLine = []
+    variationDepth = 0
+    for char in text: # variations can be nested
+        if char == "(":
+            variationDepth += 1
+        elif char == ")":
+            variationDepth -= 1
+        elif variationDepth == 0:
+            mainLine.append(char)
+    sans = []
+    for token in "".join(mainLine).split():
+        token = re.sub(r"^\d+\.+", "", token) # "12.", "12..." or "12.e4"
+        if token and not token.startswith("$") and token not in RESULT_WEIGHTS:
+            sans.append(token)
+    return sans
+
+
+def buildBook(pgnPaths, outputPath, maxPlies, minWeight):
+    '''
+    every move of the first maxPlies plies of every game counts 2 for a win, 1 for a draw or an unknown result, 0 for a
+    loss; moves with less than minWeight in total are left out. Games that start from a set up position are skipped
+    '''
+    weights = {} # (zobrist key, moveID) -> weight
+    games = skipped = 0
+    for path in pgnPaths:
+        with open(path, encoding="utf-8", errors="replace") as pgnFile:
+            for tags, sans in readPgnGames(pgnFile):
+                if "FEN" in tags:
+                    skipped += 1
+                    continue
+                games += 1
+                resultWeights = RESULT_WEIGHTS.get(tags.get("Result", "*"), (1, 1))
+                gs = GameState()
+                for san in sans[:maxPlies]:
+                    move = gs.getMoveFromSan(san)
+                    if move is None:
+                        print("%s: illegal move %s in game %d, skipping the rest of it" % (path, san, games), file=sys.stderr)
+                        break
+                    entry = (gs.zobristKey, move.moveID)
+                    weights[entry] = weights.get(entry, 0) + resultWeights[0 if gs.whiteToMove else 1]
+                    gs.makeMove(move)
+    records = sorted((key, moveID, weight) for (key, moveID), weight in weights.items() if weight >= max(minWeight, 1))
+    heaviest = max([weight for key, moveID, weight in records] or [0])
+    with open(outputPath, "wb") as bookFile:
+        for key, moveID, weight in records:
+            if heaviest > MAX_WEIGHT: # scale down to fit, keeping every move in the book
+                weight = max(1, weight * MAX_WEIGHT // heaviest)
+            bookFile.write(RECORD.pack(key, moveID, weight))
+    print("%d games (%d skipped), %d positions, %d moves written to %s" % (games, skipped, len({record[0] for record in records}), len(records), outputPath))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="build and inspect the opening book")
+    commands = parser.add_subparsers(dest="command", required=True)
+    build = commands.add_parser("build", help="build a book from PGN files")
+    build.add_argument("pgn", nargs="+")
+    build.add_argument("-o", "--output", default=BOOK_PATH)
+    build.add_argument("--plies", type=int, default=20, help="moves of each game that go into the book (default 20 plies)")
+    build.add_argument("--min-weight", type=int, default=1, help="leave out moves with a lower total weight")
+    probe = commands.add_parser("probe", help="list the book moves of a position")
+    probe.add_argument("--book", default=BOOK_PATH)
+    probe.add_argument("--fen", help="position (default: the start position)")
+    probe.add_argument("--moves", nargs="*", default=[], help="moves played from it, e.g. e2e4 e7e5")
+    args = parser.parse_args()
+    if args.command == "build":
+        buildBook(args.pgn, args.output, args.plies, args.min_weight)
+    elif args.command == "probe":
+        gs = GameState(args.fen)
+        for notation in args.moves:
+            move = gs.getMoveFromNotation(notation)
+            if move is None:
+                parser.error("illegal move " + notation)
+            gs.makeMove(move)
+        bookMoves = OpeningBook(args.book).getMoves(gs, gs.getValidMoves())
+        total = sum(weight for move, weight in bookMoves)
+        for move, weight in sorted(bookMoves, key=lambda bookMove: -bookMove[1]):
+            print("%-8s %-6s %6d %5.1f%%" % (gs.getSan(move), move.getChessNotation(), weight, 100 * weight / total))
+        if not bookMoves:
+            print("out of book")
+
+
+if __name__ == "__main__":
+    main()
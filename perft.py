@@ -0,0 +1,101 @@
+"""
+Perft: counts the leaf nodes of the move generation tree to a given depth. Checks GameState.getValidMoves, makeMove and
+undoMove against known node counts and measures their speed. Run from the project directory:
+    python perft.py                          all bundled positions, depths 1-3, checked against the known counts
+    python perft.py --depth 4 kiwipete       one bundled position
+    python perft.py --fen "<FEN>" --depth 3 --divide
+"""
+import argparse
+import sys
+import time
+
+from chessEngine import GameState
+
+# standard test positions with their known node counts for depth 1, 2, 3, ...
+perftPositions = {
+    "start": ("rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              [20, 400, 8902, 197281, 4865609, 119060324]),
+    "kiwipete": ("r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+                 [48, 2039, 97862, 4085603, 193690690]),
+    "endgame": ("8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1",
+                [14, 191, 2812, 43238, 674624, 11030083]),
+    "promotions": ("r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1",
+                   [6, 264, 9467, 422333, 15833292]),
+    "discovered checks": ("rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8",
+                          [44, 1486, 62379, 2103487, 89941194]),
+    "middlegame": ("r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10",
+                   [46, 2079, 89890, 3894594, 164075551]),
+}
+
+
+def perft(gs, depth):
+    '''
+    number of leaf nodes depth plies below the position
+    '''
+    moves = gs.getValidMoves()
+    if depth == 1:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        gs.makeMove(move)
+        nodes += perft(gs, depth - 1)
+        gs.undoMove()
+    return nodes
+
+
+def divide(gs, depth):
+    '''
+    perft split by root move, to find the move whose subtree has a wrong count
+    '''
+    counts = {}
+    for move in gs.getValidMoves():
+        gs.makeMove(move)
+        counts[move.getChessNotation()] = perft(gs, depth - 1) if depth > 1 else 1
+        gs.undoMove()
+    return counts
+
+
+def runPerft(name, fen, depth, expected=None, showDivide=False):
+    '''
+    prints nodes and nodes/second for depth 1..depth, returns False if a count differs from the expected one
+    '''
+    print("%s: %s" % (name, fen))
+    ok = True
+    for d in range(1, depth + 1):
+        gs = GameState(fen)
+        start = time.time()
+        nodes = perft(gs, d)
+        seconds = time.time() - start
+        result = ""
+        if expected is not None and d <= len(expected):
+            result = "ok" if nodes == expected[d - 1] else "FAIL (expected %d)" % expected[d - 1]
+            ok = ok and nodes == expected[d - 1]
+        print("  depth %d %12d nodes %8.2fs %10.0f nodes/s  %s" % (d, nodes, seconds, nodes / max(seconds, 1e-9), result))
+    if showDivide:
+        for notation, nodes in sorted(divide(GameState(fen), depth).items()):
+            print("    %s %d" % (notation, nodes))
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="perft node counts and speed of the move generator")
+    parser.add_argument("positions", nargs="*", help="bundled positions to run (default: all of them): " + ", ".join(perftPositions))
+    parser.add_argument("--fen", help="run an arbitrary position instead")
+    parser.add_argument("--depth", type=int, default=3)
+    parser.add_argument("--divide", action="store_true", help="also print the node count below every root move")
+    args = parser.parse_args()
+
+    ok = True
+    if args.fen:
+        ok = runPerft("fen", args.fen, args.depth, showDivide=args.divide)
+    else:
+        for name in args.positions or perftPositions:
+            if name not in perftPositions:
+                parser.error("unknown position %r" % name)
+            fen, expected = perftPositions[name]
+            ok = runPerft(name, fen, args.depth, expected, args.divide) and ok
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
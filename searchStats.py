@@ -0,0 +1,101 @@
+"""
+Statistics of one search, for telling whether a change to the search helped or hurt. Pass a SearchStats to
+smartMoveFinder.findBestMove (stats=...) and it is filled in while searching; nothing is counted without one.
+toJson() dumps everything, SearchStats(profile=True) also runs cProfile around the search.
+"""
+import cProfile
+import io
+import json
+import pstats
+import time
+
+
+class SearchStats():
+    def __init__(self, profile=False):
+        self.iterations = [] # one dict per depth of the iterative deepening: nodes, seconds, score, best move
+        self.quiescenceNodes = 0
+        self.leafEvals = 0 # static evaluations (scoreBoard and bitbase scores) at the leaves of the quiescence search
+        self.ttProbes = 0
+        self.ttHits = 0 # probes that found the position
+        self.ttCutoffs = 0 # hits that answered the node without searching it
+        self.ttStores = 0
+        self.firstMoveCutoffs = 0 # beta cutoffs by the first move searched at a node
+        self.laterMoveCutoffs = 0
+        self.nullMoveCutoffs = 0
+        self.reductions = 0 # late moves searched at a reduced depth
+        self.researches = 0 # reduced moves that beat alpha and were searched again at full depth
+        self.pvsResearches = 0 # moves that beat alpha in a null window search and were searched again with the full window
+        self.aspirationResearches = 0 # root searches repeated with a wider window
+        self.phaseTimes = {} # seconds per phase: book, search (the whole iterative deepening), quiescence (part of search)
+        self.bookMove = False
+        self.bestMove = None
+        self.nodes = 0
+        self.seconds = 0
+        self.profiler = cProfile.Profile() if profile else None
+        self.startTime = None
+
+    def start(self):
+        self.startTime = time.perf_counter()
+        if self.profiler is not None:
+            self.profiler.enable()
+
+    def finish(self, bestMove, nodes):
+        if self.profiler is not None:
+            self.profiler.disable()
+        self.seconds = time.perf_counter() - self.startTime
+        self.bestMove = bestMove.getChessNotation() if bestMove is not None else None
+        self.nodes = nodes
+
+    def addPhaseTime(self, phase, seconds):
+        self.phaseTimes[phase] = self.phaseTimes.get(phase, 0) + seconds
+
+    def addIteration(self, depth, nodes, seconds, score, bestMove, completed):
+        self.iterations.append({"depth": depth, "nodes": nodes, "seconds": seconds, "score": score,
+                                "bestMove": bestMove.getChessNotation() if bestMove is not None else None, "completed": completed})
+
+    def profileSummary(self, sortBy="cumulative", limit=25):
+        '''
+        the pstats report of the profiled search, None if it was not profiled
+        '''
+        if self.profiler is None:
+            return None
+        report = io.StringIO()
+        pstats.Stats(self.profiler, stream=report).sort_stats(sortBy).print_stats(limit)
+        return report.getvalue()
+
+    def toDict(self):
+        cutoffs = self.firstMoveCutoffs + self.laterMoveCutoffs
+        stats = {
+            "bestMove": self.bestMove,
+            "bookMove": self.bookMove,
+            "nodes": self.nodes,
+            "quiescenceNodes": self.quiescenceNodes,
+            "seconds": self.seconds,
+            "nodesPerSecond": self.nodes / self.seconds if self.seconds else 0,
+            "iterations": self.iterations,
+            "leafEvals": self.leafEvals,
+            "ttProbes": self.ttProbes,
+            "ttHits": self.ttHits,
+            "ttHitRate": self.ttHits / self.ttProbes if self.ttProbes else 0,
+            "ttCutoffs": self.ttCutoffs,
+            "ttStores": self.ttStores,
+            "betaCutoffs": cutoffs,
+            "firstMoveCutoffs": self.firstMoveCutoffs,
+            "laterMoveCutoffs": self.laterMoveCutoffs,
+            "firstMoveCutoffRate": self.firstMoveCutoffs / cutoffs if cutoffs else 0, # how often the ordering got it right
+            "nullMoveCutoffs": self.nullMoveCutoffs,
+            "reductions": self.reductions,
+            "researches": self.researches,
+            "pvsResearches": self.pvsResearches,
+            "aspirationResearches": self.aspirationResearches,
+            "phaseTimes": self.phaseTimes,
+        }
+        if self.profiler is not None:
+            functions = pstats.Stats(self.profiler).stats # (file, line, name) -> (calls, primitive calls, tottime, cumtime, callers)
+            top = sorted(functions.items(), key=lambda item: -item[1][2])[:25]
+            stats["profile"] = [{"function": "%s:%d(%s)" % function, "calls": calls, "tottime": tottime, "cumtime": cumtime}
+                                for function, (primitiveCalls, calls, tottime, cumtime, callers) in top]
+        return stats
+
+    def toJson(self, indent=None):
+        return json.dumps(self.toDict(), indent=indent)
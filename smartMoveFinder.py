@@ -2,72 +2,59 @@
 Handling AI moves.
 """
 import random
-
-
-pieceScore = {"K": 0, "Q": 9, "R": 5, "B": 3, "N": 3, "p": 1}
-
-knightScores = [[0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0],
-                 [0.1, 0.3, 0.5, 0.5, 0.5, 0.5, 0.3, 0.1],
-                 [0.2, 0.5, 0.6, 0.65, 0.65, 0.6, 0.5, 0.2],
-                 [0.2, 0.55, 0.65, 0.7, 0.7, 0.65, 0.55, 0.2],
-                 [0.2, 0.5, 0.65, 0.7, 0.7, 0.65, 0.5, 0.2],
-                 [0.2, 0.55, 0.6, 0.65, 0.65, 0.6, 0.55, 0.2],
-                 [0.1, 0.3, 0.5, 0.55, 0.55, 0.5, 0.3, 0.1],
-                 [0.0, 0.1, 0.2, 0.2, 0.2, 0.2, 0.1, 0.0]]
-
-bishopScores = [[0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0],
-                 [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                 [0.2, 0.4, 0.5, 0.6, 0.6, 0.5, 0.4, 0.2],
-                 [0.2, 0.5, 0.5, 0.6, 0.6, 0.5, 0.5, 0.2],
-                 [0.2, 0.4, 0.6, 0.6, 0.6, 0.6, 0.4, 0.2],
-                 [0.2, 0.6, 0.6, 0.6, 0.6, 0.6, 0.6, 0.2],
-                 [0.2, 0.5, 0.4, 0.4, 0.4, 0.4, 0.5, 0.2],
-                 [0.0, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.0]]
-
-rookScores = [[0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25],
-               [0.5, 0.75, 0.75, 0.75, 0.75, 0.75, 0.75, 0.5],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.0, 0.25, 0.25, 0.25, 0.25, 0.25, 0.25, 0.0],
-               [0.25, 0.25, 0.25, 0.5, 0.5, 0.25, 0.25, 0.25]]
-
-queenScores = [[0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0],
-                [0.2, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.3, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.4, 0.4, 0.5, 0.5, 0.5, 0.5, 0.4, 0.3],
-                [0.2, 0.5, 0.5, 0.5, 0.5, 0.5, 0.4, 0.2],
-                [0.2, 0.4, 0.5, 0.4, 0.4, 0.4, 0.4, 0.2],
-                [0.0, 0.2, 0.2, 0.3, 0.3, 0.2, 0.2, 0.0]]
-
-pawnScores = [[0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8, 0.8],
-               [0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7, 0.7],
-               [0.3, 0.3, 0.4, 0.5, 0.5, 0.4, 0.3, 0.3],
-               [0.25, 0.25, 0.3, 0.45, 0.45, 0.3, 0.25, 0.25],
-               [0.2, 0.2, 0.2, 0.4, 0.4, 0.2, 0.2, 0.2],
-               [0.25, 0.15, 0.1, 0.2, 0.2, 0.1, 0.15, 0.25],
-               [0.25, 0.3, 0.3, 0.0, 0.0, 0.3, 0.3, 0.25],
-               [0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2, 0.2]]
-
-piecePositionScores = {  "wN": knightScores,
-                         "bN": knightScores[::-1],
-                         "wB": bishopScores,
-                         "bB": bishopScores[::-1],
-                         "wQ": queenScores,
-                         "bQ": queenScores[::-1],
-                         "wR": rookScores,
-                         "bR": rookScores[::-1],
-                         "wp": pawnScores,
-                         "bp": pawnScores[::-1]}
+import time
+from multiprocessing import Pool
+# the evaluation tables live in chessEngine so that makeMove/undoMove can keep the score up to date
+from chessEngine import pieceScore, knightScores, bishopScores, rookScores, queenScores, pawnScores, piecePositionScores
+from chessEngine import EMPTY, WHITE, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, TYPE_MASK, pieceNames
+from transpositionTable import TranspositionTable, EXACT, LOWERBOUND, UPPERBOUND
+from openingBook import OpeningBook
+import bitbases
 
 
 CHECKMATE = 1000
 STALEMATE = 0
-DEPTH = 4
+DEPTH = 4 # deepest iteration of findBestMove when no depth is given
+TIME_LIMIT = 3.0 # seconds per move, the iteration running when it runs out is abandoned
+DELTA_MARGIN = 2 # quiescence search skips captures that can't raise alpha even if they win this much more than the captured piece
+NULL_WINDOW = 0.001 # width of a null window (alpha, alpha + NULL_WINDOW): less than any real score difference, scores go in steps of 0.01
+BITBASE_WIN = 500 # base score of a position the endgame bitbases say is won
+BITBASE_DEPTH = 8 # deepest iteration in won bitbase endings: the search is cheap there and needs the depth to find the mate
+
+openingBook = OpeningBook() # assets/book.bin, empty if the file is missing
+searchPool = None # worker processes of findBestMoveParallel, started on first use and kept with their transposition tables
+searchPoolSize = 0
+parallelSearchID = 0
+workerSearchID = None # in a pool process: the search its transposition table generation and ordering tables belong to
+
+# move ordering: the hash move, then captures by MVV-LVA (most valuable victim, least valuable attacker),
+# then the killer moves of the ply (quiet moves that caused a beta cutoff in a sibling), then quiet moves by history score
+MOVE_ORDERING = True
+MAX_PLY = 64
+HASH_MOVE_SCORE = 1000000
+CAPTURE_SCORE = 100000
+KILLER_SCORES = (90000, 80000)
+mvvLvaValues = [0] * 8
+for pieceType, value in ((PAWN, 1), (KNIGHT, 3), (BISHOP, 3), (ROOK, 5), (QUEEN, 9), (KING, 20)):
+    mvvLvaValues[pieceType] = value
 
-cache = {}
+# selective search. Null move pruning: a node where passing (a null move) searched NULL_MOVE_REDUCTION plies shallower
+# still fails high is cut off, a real move would do at least as well unless the position is a zugzwang.
+# Late move reductions: quiet moves ordered after the first LMR_MOVES of a node are searched a ply shallower with a
+# null window first, and only searched again at full depth if they beat alpha
+NULL_MOVE_PRUNING = True
+NULL_MOVE_REDUCTION = 2
+NULL_MOVE_MIN_DEPTH = 4
+LATE_MOVE_REDUCTIONS = True
+LMR_MIN_DEPTH = 3
+LMR_MOVES = 3
+# principal variation search: after the first move of a node, moves are searched with a null window that only proves
+# they are no better than alpha, and searched again with the full window when one turns out better.
+# Aspiration windows: each iteration searches the root with a window around the last iteration's score, widened and
+# searched again if the score falls outside it
+PRINCIPAL_VARIATION_SEARCH = True
+ASPIRATION_WINDOWS = True
+ASPIRATION_WINDOW = 0.5 # pawns on either side of the last score, doubled on every failure
 
 '''
 A positive score means that the white player is winning. A negative score means that the black player is winning.
@@ -81,18 +68,7 @@ def scoreBoard(gs):
     elif gs.stalemate:
         return STALEMATE
 
-    score = 0
-    for row in range(len(gs.board)):
-        for col in range(len(gs.board[row])):
-            piece = gs.board[row][col]
-            if piece != "--":
-                piecePositionScore = 0
-                if piece[1] != "K":
-                    piecePositionScore = piecePositionScores[piece][row][col]
-                if piece[0] == "w":
-                    score += pieceScore[piece[1]] + piecePositionScore
-                if piece[0] == "b":
-                    score -= pieceScore[piece[1]] + piecePositionScore
+    score = gs.pieceSquareScore / 100 # material and piece positions, kept up to date by makeMove/undoMove
     
     if gs.whiteToMove:
         opponentKingRow, opponentKingCol = gs.whiteKingLocation
@@ -116,51 +92,666 @@ def scoreBoard(gs):
 
 def isEndgame(gs):
     """Checks if the game is in EndGame"""
-    whitePieces = sum(piece != "--" for row in gs.board for piece in row if piece[0] == "w")
-    blackPieces = sum(piece != "--" for row in gs.board for piece in row if piece[0] == "b")
+    whitePieces = gs.whitePieceCount
+    blackPieces = gs.blackPieceCount
 
     if whitePieces <= 7 or blackPieces <= 7 or (whitePieces + blackPieces <= 14):
         return whitePieces, blackPieces, True
     else:
         return whitePieces, blackPieces, False
 
-def findBestMove(gs, validMoves, returnQueue):
-    global nextMove
-    nextMove = None
-    random.shuffle(validMoves)
-    findMoveNegaMaxAlphaBeta(gs, validMoves, depth=DEPTH, alpha=-CHECKMATE, beta=CHECKMATE, turnMultiplier = 1 if gs.whiteToMove else -1)
-    returnQueue.put(nextMove)
+def bitbaseScore(gs):
+    '''
+    None if the position is not in the endgame bitbases, otherwise its score for the side to move: 0 for a draw, about
+    BITBASE_WIN for a win. A won position scores more with more material (a promoted pawn) or a further advanced pawn,
+    and with the lone king nearer the edge, nearer the winning king and with fewer squares to go to, so the search
+    makes progress towards mate
+    '''
+    result = bitbases.probe(gs)
+    if result is None:
+        return None
+    if result == bitbases.DRAW:
+        return STALEMATE
+    if result == bitbases.LOSS and not gs.getValidMoves():
+        return -CHECKMATE
+    pieceType, strongToMove, strongKing, weakKing, pieceSquare = bitbases.normalize(gs)
+    weakRow, weakCol = divmod(weakKing, 8)
+    centreDistance = max(3 - weakRow, weakRow - 4) + max(3 - weakCol, weakCol - 4) # 0 in the centre, 6 in a corner
+    kingDistance = abs(weakRow - (strongKing >> 3)) + abs(weakCol - (strongKing & 7))
+    mobility = len(bitbases.weakKingMoves(pieceType, strongKing, weakKing, pieceSquare))
+    score = BITBASE_WIN + 10 * pieceScore[pieceNames[WHITE | pieceType][1]] + 3 * centreDistance - kingDistance - mobility
+    if pieceType == PAWN:
+        score += 5 * (6 - (pieceSquare >> 3)) # ranks the pawn has advanced
+    return score if result == bitbases.WIN else -score
 
 
+def defaultDepth(gs):
+    '''
+    the deepest iteration when the caller gives no depth: DEPTH, or BITBASE_DEPTH in won bitbase endings
+    '''
+    if bitbases.probe(gs) in (bitbases.WIN, bitbases.LOSS):
+        return BITBASE_DEPTH
+    return DEPTH
 
-def findMoveNegaMaxAlphaBeta(gs, validMoves, depth, alpha, beta, turnMultiplier):
-    global nextMove
-    if depth == 0:
-        return turnMultiplier * scoreBoard(gs)
-    
-    # Check if the current position is in the cache
-    position_key = str(gs.board) + str(gs.whiteToMove)
-    if position_key in cache:
-        return cache[position_key]
-    
-    maxScore = -CHECKMATE
-    for move in validMoves:
-        gs.makeMove(move)
-        nextMoves = gs.getValidMoves()
-        score = -findMoveNegaMaxAlphaBeta(gs, nextMoves, depth - 1, -beta, -alpha, -turnMultiplier)
-        if score > maxScore:
-            maxScore = score
-            if depth == DEPTH:
-                nextMove = move
+
+class SearchTimeout(Exception):
+    pass
+
+
+class RootMove():
+    '''
+    a legal move of the searched position with what the deepest completed iteration found for it: score (for the side to
+    move) and pv, the principal variation starting with the move. Exact for the best multiPV moves, for the others the
+    score is only an upper bound and the pv may stop after the move
+    '''
+    def __init__(self, move):
+        self.move = move
+        self.score = -CHECKMATE - 1
+        self.pv = [move]
+        self.depth = 0
+
+
+class SearchLimits():
+    '''
+    when a search stops: after the maxDepth iteration (None for the default depth, see defaultDepth), after timeLimit
+    seconds or nodeLimit nodes (None for no limit), or when stopEvent (a threading.Event or anything else with is_set()) is set. The best multiPV moves get exact
+    scores and principal variations
+    '''
+    def __init__(self, maxDepth=None, timeLimit=TIME_LIMIT, nodeLimit=None, stopEvent=None, multiPV=1):
+        self.maxDepth = maxDepth
+        self.timeLimit = timeLimit
+        self.nodeLimit = nodeLimit
+        self.stopEvent = stopEvent
+        self.multiPV = multiPV
+
+
+class Searcher():
+    '''
+    a search engine with its own state: transposition table, killer and history tables, the limits and SearchStats of
+    the running search and which search features are on (starting from the module constants). Searchers don't share
+    anything, so several can search at the same time in threads, except a transposition table passed in to share
+    between them. Otherwise each one gets a table of 2 ** ttSizeBits entries
+    '''
+    def __init__(self, transpositionTable=None, ttSizeBits=18):
+        self.transpositionTable = transpositionTable if transpositionTable is not None else TranspositionTable(ttSizeBits)
+        self.openingBook = openingBook
+        self.moveOrdering = MOVE_ORDERING
+        self.nullMovePruning = NULL_MOVE_PRUNING
+        self.lateMoveReductions = LATE_MOVE_REDUCTIONS
+        self.principalVariationSearch = PRINCIPAL_VARIATION_SEARCH
+        self.aspirationWindows = ASPIRATION_WINDOWS
+        self.killerMoves = [[None, None] for ply in range(MAX_PLY)] # moveIDs
+        self.historyScores = [[0] * 64 for piece in pieceNames] # [pieceMoved][endSq], raised on quiet beta cutoffs
+        # the running search
+        self.nodeCount = 0
+        self.searchDepth = 0
+        self.stopTime = None # time.time() to stop at
+        self.maxNodes = None
+        self.stopSignal = None
+        self.stats = None
+        self.rootPly = 0 # len(gs.moveLog) at the root
+
+    def findBestMove(self, gs, validMoves, limits=None, useBook=True, infoCallback=None, stats=None):
+        '''
+        the move to play: from the opening book if the position is in it (and useBook), otherwise the best move of
+        search, None if there is no legal move. infoCallback(depth, score, bestMove) is called after every completed
+        iteration, score is from the point of view of the side to move. stats (a SearchStats) is filled in with what the
+        search did, it ends up holding the move too
+        '''
+        self.nodeCount = 0
+        if stats is not None:
+            stats.start()
+        if useBook:
+            phaseStart = time.perf_counter()
+            bookMove = self.openingBook.pickMove(gs, validMoves)
+            if stats is not None:
+                stats.addPhaseTime("book", time.perf_counter() - phaseStart)
+            if bookMove is not None:
+                if stats is not None:
+                    stats.bookMove = True
+                    stats.finish(bookMove, 0)
+                return bookMove
+        rootMoves = [RootMove(move) for move in validMoves]
+        random.shuffle(rootMoves)
+        iterationCallback = None
+        if infoCallback is not None:
+            iterationCallback = lambda depth, rootMoves: infoCallback(depth, rootMoves[0].score, rootMoves[0].move)
+        self.iterativeDeepening(gs, rootMoves, limits or SearchLimits(), iterationCallback, stats)
+        bestMove = rootMoves[0].move if rootMoves else None
+        if stats is not None:
+            stats.finish(bestMove, self.nodeCount)
+        return bestMove
+
+    def search(self, gs, limits=None, iterationCallback=None, stats=None):
+        '''
+        searches gs without the opening book and returns all its legal moves as RootMoves, best first, with the scores
+        and principal variations of the deepest completed iteration. iterationCallback(depth, rootMoves) is called
+        after every completed iteration
+        '''
+        if stats is not None:
+            stats.start()
+        rootMoves = [RootMove(move) for move in gs.getValidMoves()]
+        self.iterativeDeepening(gs, rootMoves, limits or SearchLimits(), iterationCallback, stats)
+        if stats is not None:
+            stats.finish(rootMoves[0].move if rootMoves else None, self.nodeCount)
+        return rootMoves
+
+    def newGame(self):
+        '''
+        forgets what earlier searches learned: the transposition table and the killer and history scores
+        '''
+        self.transpositionTable.clear()
+        for scores in self.historyScores:
+            scores[:] = [0] * 64
+        for killers in self.killerMoves:
+            killers[0] = killers[1] = None
+
+    def startSearch(self, gs, limits, stats=None):
+        self.transpositionTable.newSearch()
+        self.resetMoveOrdering()
+        self.nodeCount = 0
+        self.stopTime = time.time() + limits.timeLimit if limits.timeLimit is not None else None
+        self.maxNodes = limits.nodeLimit
+        self.stopSignal = limits.stopEvent
+        self.stats = stats
+        self.rootPly = len(gs.moveLog)
+
+    def iterativeDeepening(self, gs, rootMoves, limits, iterationCallback, stats):
+        '''
+        searches depth 1, 2, ... until limits stop it. Depth 1 always completes. rootMoves is sorted best first after
+        every completed iteration
+        '''
+        self.nodeCount = 0
+        if not rootMoves:
+            return
+        maxDepth = limits.maxDepth if limits.maxDepth is not None else defaultDepth(gs)
+        self.startSearch(gs, limits, stats)
+        if self.moveOrdering: # captures first for depth 1, later iterations search the moves in the order of their scores
+            rootMoves.sort(key=lambda rootMove, moveKey=self.moveOrderKey(None, 0): moveKey(rootMove.move), reverse=True)
+        score = 0
+        searchStart = time.perf_counter()
+        for depth in range(1, maxDepth + 1):
+            self.searchDepth = depth
+            iterationStart = time.perf_counter()
+            iterationNodes = self.nodeCount
+            try:
+                results = self.aspirationSearch(gs, rootMoves, depth, score, limits.multiPV)
+            except SearchTimeout:
+                while len(gs.moveLog) > self.rootPly: # unwind the moves (and null moves) of the abandoned iteration
+                    gs.undoMove()
+                if stats is not None:
+                    stats.addIteration(depth, self.nodeCount - iterationNodes, time.perf_counter() - iterationStart, None, None, False)
+                break
+            # the next iteration searches the moves best first
+            rootMoves[:] = [rootMove for rootMove, score, pv in results]
+            for rootMove, rootScore, pv in results:
+                rootMove.score, rootMove.pv, rootMove.depth = rootScore, pv, depth
+            score = rootMoves[0].score
+            if stats is not None:
+                stats.addIteration(depth, self.nodeCount - iterationNodes, time.perf_counter() - iterationStart, score, rootMoves[0].move, True)
+            if iterationCallback is not None:
+                iterationCallback(depth, rootMoves)
+        if stats is not None:
+            stats.addPhaseTime("search", time.perf_counter() - searchStart)
+        self.stats = self.stopSignal = None
+
+    def aspirationSearch(self, gs, rootMoves, depth, lastScore, multiPV):
+        '''
+        one iteration: the root searched with a window around lastScore, the score of the iteration before.
+        Only with multiPV 1, the other lines would fall outside the window
+        '''
+        alpha, beta = -CHECKMATE, CHECKMATE
+        window = ASPIRATION_WINDOW
+        if self.aspirationWindows and multiPV == 1 and depth > 1 and abs(lastScore) < BITBASE_WIN: # mate and bitbase scores jump too much
+            alpha, beta = lastScore - window, lastScore + window
+        while True:
+            results = self.searchRoot(gs, rootMoves, depth, alpha, beta, multiPV)
+            score = results[0][1]
+            if score <= alpha and alpha > -CHECKMATE: # fail low: every move is worse than the window, the best one is unknown
+                window *= 2
+                alpha = max(score - window, -CHECKMATE)
+            elif score >= beta and beta < CHECKMATE: # fail high: the best move is better than the window, by how much is unknown
+                window *= 2
+                beta = min(score + window, CHECKMATE)
+            else:
+                return results
+            if self.stats is not None:
+                self.stats.aspirationResearches += 1
+
+    def searchRoot(self, gs, rootMoves, depth, alpha, beta, multiPV):
+        '''
+        searches the root moves in order to depth and returns [(rootMove, score, pv)], best first (stable, so moves keep
+        their order among equal scores). A move gets an exact score if it is one of the best multiPV so far, the others
+        are searched with a null window that only proves they are not. Stops at a move that reaches beta
+        '''
+        turnMultiplier = 1 if gs.whiteToMove else -1
+        results = []
+        bestScores = [] # the best multiPV scores so far, highest first
+        for moveNumber, rootMove in enumerate(rootMoves):
+            bound = max(alpha, bestScores[-1]) if len(bestScores) == multiPV else alpha
+            gs.makeMove(rootMove.move)
+            if moveNumber < multiPV or not self.principalVariationSearch:
+                score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -bound, -turnMultiplier)
+            else:
+                score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1, -bound - NULL_WINDOW, -bound, -turnMultiplier)
+                if bound < score < beta: # one of the best lines after all: its real score is needed
+                    if self.stats is not None:
+                        self.stats.pvsResearches += 1
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -bound, -turnMultiplier)
+            # read the line now, before the other moves overwrite its transposition table entries
+            pv = [rootMove.move] + self.tableLine(gs, depth + 2)
+            gs.undoMove()
+            results.append((rootMove, score, pv))
+            bestScores.append(score)
+            bestScores.sort(reverse=True)
+            del bestScores[multiPV:]
+            if score >= beta and beta < CHECKMATE:
+                break
+        results.sort(key=lambda result: -result[1])
+        return results
+
+    def principalVariation(self, gs, bestMove, maxLength):
+        '''
+        the expected line of play: bestMove followed by the best moves stored in the transposition table, as long as
+        they are legal and don't repeat a position of the line
+        '''
+        gs.makeMove(bestMove)
+        line = [bestMove] + self.tableLine(gs, maxLength - 1)
         gs.undoMove()
-        if maxScore > alpha: #pruning happens
-            alpha = maxScore
-        
-        if alpha >= beta:
+        return line
+
+    def tableLine(self, gs, maxLength):
+        '''
+        the best moves stored in the transposition table from gs on, as in principalVariation
+        '''
+        line = []
+        seen = {gs.zobristKey}
+        while len(line) < maxLength:
+            entry = self.transpositionTable.probe(gs.zobristKey)
+            if entry is None or entry[3] is None:
+                break
+            moves = [move for move in gs.getValidMoves() if move == entry[3]]
+            if not moves:
+                break
+            gs.makeMove(moves[0])
+            line.append(moves[0])
+            if gs.zobristKey in seen:
+                break
+            seen.add(gs.zobristKey)
+        for move in line:
+            gs.undoMove()
+        return line
+
+    def resetMoveOrdering(self):
+        # killers only make sense within one search, history is halved so it slowly forgets older positions
+        for killers in self.killerMoves:
+            killers[0] = killers[1] = None
+        for scores in self.historyScores:
+            for square in range(64):
+                scores[square] >>= 1
+
+    def orderMoves(self, moves, hashMove, ply):
+        '''
+        sorts moves in place, most promising first
+        '''
+        if self.moveOrdering:
+            moves.sort(key=self.moveOrderKey(hashMove, ply), reverse=True)
+
+    def moveOrderKey(self, hashMove, ply):
+        '''
+        sort key for the moves of a node, higher is searched first
+        '''
+        hashMoveID = hashMove.moveID if hashMove is not None else -1
+        killers = self.killerMoves[ply] if ply < MAX_PLY else (None, None)
+        historyScores = self.historyScores
+        def moveScore(move):
+            if move.moveID == hashMoveID:
+                return HASH_MOVE_SCORE
+            if move.pieceCaptured != EMPTY:
+                return CAPTURE_SCORE + 10 * mvvLvaValues[move.pieceCaptured & TYPE_MASK] - mvvLvaValues[move.pieceMoved & TYPE_MASK]
+            if move.isPawnPromotion and move.promotionPiece == QUEEN:
+                return CAPTURE_SCORE
+            if move.moveID == killers[0]:
+                return KILLER_SCORES[0]
+            if move.moveID == killers[1]:
+                return KILLER_SCORES[1]
+            return historyScores[move.pieceMoved][move.endSq]
+        return moveScore
+
+    def recordCutoff(self, move, depth, ply):
+        '''
+        a quiet move caused a beta cutoff: remember it as a killer for this ply and raise its history score
+        '''
+        if move.pieceCaptured != EMPTY or move.isPawnPromotion:
+            return # captures are already ordered first
+        if ply < MAX_PLY:
+            killers = self.killerMoves[ply]
+            if killers[0] != move.moveID:
+                killers[1] = killers[0]
+                killers[0] = move.moveID
+        self.historyScores[move.pieceMoved][move.endSq] += depth * depth
+
+    def checkLimits(self):
+        # only called every 256 nodes, a few milliseconds, and never during the depth 1 iteration so there is always a move
+        if self.searchDepth > 1:
+            if (self.stopTime is not None and time.time() >= self.stopTime) or (self.maxNodes is not None and self.nodeCount >= self.maxNodes):
+                raise SearchTimeout()
+            if self.stopSignal is not None and self.stopSignal.is_set():
+                raise SearchTimeout()
+
+    def findMoveNegaMaxAlphaBeta(self, gs, depth, alpha, beta, turnMultiplier):
+        '''
+        the search below the root (searchRoot): the moves are generated in stages, only as far as needed
+        '''
+        self.nodeCount += 1
+        if self.nodeCount & 255 == 0:
+            self.checkLimits()
+        stats = self.stats
+        if depth == 0:
+            if stats is None:
+                return self.quiescenceSearch(gs, alpha, beta, turnMultiplier)
+            phaseStart = time.perf_counter()
+            score = self.quiescenceSearch(gs, alpha, beta, turnMultiplier)
+            stats.addPhaseTime("quiescence", time.perf_counter() - phaseStart)
+            return score
+        # endgames the bitbases know to be drawn need no search. Won ones are still searched to find the way to mate,
+        # with the bitbase score as the evaluation at the horizon
+        if gs.whitePieceCount + gs.blackPieceCount <= 3 and bitbases.probe(gs) == bitbases.DRAW:
+            return STALEMATE
+
+        # Check if the current position is in the transposition table
+        alphaOriginal = alpha
+        ply = len(gs.moveLog) - self.rootPly
+        hashMove = None
+        entry = self.transpositionTable.probe(gs.zobristKey)
+        if stats is not None:
+            stats.ttProbes += 1
+            stats.ttHits += entry is not None
+        if entry is not None:
+            entryDepth, flag, score, hashMove = entry
+            if entryDepth >= depth:
+                if flag == EXACT:
+                    if stats is not None:
+                        stats.ttCutoffs += 1
+                    return score
+                elif flag == LOWERBOUND:
+                    alpha = max(alpha, score)
+                elif flag == UPPERBOUND:
+                    beta = min(beta, score)
+                if alpha >= beta:
+                    if stats is not None:
+                        stats.ttCutoffs += 1
+                    return score
+        if self.moveOrdering:
+            moves = gs.getValidMovesStaged(hashMove, self.moveOrderKey(hashMove, ply))
+            inCheck = gs.inCheck
+        else:
+            moves = gs.getValidMovesStaged()
+            inCheck = gs.inCheck
+
+        # null move pruning, not in check (passing would be illegal), not right after a null move, not with a mate score
+        # to prove, and not in the endgame where zugzwang is common. The moves generator above is only started after it
+        if (self.nullMovePruning and depth >= NULL_MOVE_MIN_DEPTH and not inCheck and gs.moveLog[-1] is not None
+                and abs(beta) < BITBASE_WIN and not isEndgame(gs)[2] and turnMultiplier * scoreBoard(gs) >= beta):
+            gs.makeNullMove()
+            score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1 - NULL_MOVE_REDUCTION, -beta, -beta + NULL_WINDOW, -turnMultiplier)
+            gs.undoNullMove()
+            if score >= beta:
+                if stats is not None:
+                    stats.nullMoveCutoffs += 1
+                return beta
+        reduce = self.lateMoveReductions and depth >= LMR_MIN_DEPTH and not inCheck
+        principalVariationSearch = self.principalVariationSearch
+        killers = self.killerMoves[ply] if ply < MAX_PLY else (None, None)
+
+        maxScore = -CHECKMATE - 1 # below any score, so a move is chosen even if all of them get mated
+        bestMove = None
+        for moveNumber, move in enumerate(moves):
+            gs.makeMove(move)
+            fullDepth = True
+            if (reduce and moveNumber >= LMR_MOVES and move.pieceCaptured == EMPTY and not move.isPawnPromotion and move.moveID not in killers
+                    and not gs.squareUnderAttack(gs.whiteKingSquare if gs.whiteToMove else gs.blackKingSquare)): # checks aren't reduced
+                score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 2, -alpha - NULL_WINDOW, -alpha, -turnMultiplier)
+                fullDepth = score > alpha
+                if stats is not None:
+                    stats.reductions += 1
+                    stats.researches += fullDepth
+            if fullDepth:
+                if moveNumber == 0 or not principalVariationSearch:
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -alpha, -turnMultiplier)
+                else:
+                    score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1, -alpha - NULL_WINDOW, -alpha, -turnMultiplier)
+                    if alpha < score < beta: # better than the first move after all: its real score is needed
+                        if stats is not None:
+                            stats.pvsResearches += 1
+                        score = -self.findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -alpha, -turnMultiplier)
+            if score > maxScore:
+                maxScore = score
+                bestMove = move
+            gs.undoMove()
+            if maxScore > alpha: #pruning happens
+                alpha = maxScore
+
+            if alpha >= beta:
+                self.recordCutoff(move, depth, ply)
+                if stats is not None:
+                    if moveNumber == 0:
+                        stats.firstMoveCutoffs += 1
+                    else:
+                        stats.laterMoveCutoffs += 1
+                break
+        if bestMove is None: # no legal moves
+            return -CHECKMATE if inCheck else STALEMATE
+        # Store the result with the kind of bound it is for future use
+        if maxScore <= alphaOriginal:
+            flag = UPPERBOUND
+        elif maxScore >= beta:
+            flag = LOWERBOUND
+        else:
+            flag = EXACT
+        self.transpositionTable.store(gs.zobristKey, depth, flag, maxScore, bestMove)
+        if stats is not None:
+            stats.ttStores += 1
+        return maxScore
+
+    def quiescenceSearch(self, gs, alpha, beta, turnMultiplier):
+        '''
+        at the horizon keep searching captures (and promotions) until the position is quiet, so the evaluation is not
+        taken in the middle of an exchange. The side to move can always "stand pat" on the static evaluation instead.
+        '''
+        self.nodeCount += 1
+        if self.nodeCount & 255 == 0:
+            self.checkLimits()
+        stats = self.stats
+        if stats is not None:
+            stats.quiescenceNodes += 1
+        if gs.whitePieceCount + gs.blackPieceCount <= 3:
+            score = bitbaseScore(gs)
+            if score is not None:
+                if stats is not None:
+                    stats.leafEvals += 1
+                return score
+        checkState = gs.checkForPinsAndChecks()
+        if checkState[0]:
+            # no standing pat in check: search every evasion, none means checkmate
+            captures = gs.getValidMoves()
+            if not captures:
+                return -CHECKMATE
+            standPat = -CHECKMATE
+            deltaPruning = False
+        else:
+            standPat = turnMultiplier * scoreBoard(gs)
+            if stats is not None:
+                stats.leafEvals += 1
+            if standPat >= beta:
+                return standPat
+            if standPat > alpha:
+                alpha = standPat
+            # delta pruning is off when a capture can take a side down to the endgame piece count, scoreBoard jumps by 50 there
+            deltaPruning = gs.whitePieceCount > 8 and gs.blackPieceCount > 8
+            captures = gs.getValidCaptures(checkState)
+        self.orderMoves(captures, None, MAX_PLY)
+        for move in captures:
+            if deltaPruning:
+                gain = pieceScore[pieceNames[move.pieceCaptured][1]] if move.pieceCaptured != EMPTY else 0
+                if move.isPawnPromotion:
+                    gain += pieceScore[pieceNames[move.promotionPiece | WHITE][1]] - pieceScore["p"]
+                if standPat + gain + DELTA_MARGIN <= alpha:
+                    continue
+            gs.makeMove(move)
+            score = -self.quiescenceSearch(gs, -beta, -alpha, -turnMultiplier)
+            gs.undoMove()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+
+# the Searcher behind the module level functions, used by the GUI and the tools
+searcher = Searcher()
+
+
+def findBestMove(gs, validMoves, returnQueue, maxDepth=None, timeLimit=TIME_LIMIT, nodeLimit=None, infoCallback=None, stopEvent=None, useBook=True, stats=None):
+    '''
+    Searcher.findBestMove of the module's searcher, putting the move on returnQueue so it can run in a thread
+    '''
+    returnQueue.put(searcher.findBestMove(gs, validMoves, SearchLimits(maxDepth, timeLimit, nodeLimit, stopEvent), useBook, infoCallback, stats))
+
+
+def analyse(gs, maxDepth=None, timeLimit=TIME_LIMIT, nodeLimit=None, multiPV=1, iterationCallback=None, stopEvent=None, stats=None):
+    '''
+    Searcher.search of the module's searcher: all legal moves of gs as RootMoves, best first
+    '''
+    return searcher.search(gs, SearchLimits(maxDepth, timeLimit, nodeLimit, stopEvent, multiPV), iterationCallback, stats)
+
+
+def principalVariation(gs, bestMove, maxLength):
+    return searcher.principalVariation(gs, bestMove, maxLength)
+
+
+def newGame():
+    searcher.newGame()
+
+
+def getSearchPool(workers):
+    global searchPool, searchPoolSize
+    if searchPool is None or searchPoolSize != workers:
+        closeSearchPool()
+        searchPool = Pool(workers)
+        searchPoolSize = workers
+    return searchPool
+
+
+def closeSearchPool():
+    global searchPool, searchPoolSize
+    if searchPool is not None:
+        searchPool.terminate()
+        searchPool.join()
+        searchPool = None
+        searchPoolSize = 0
+
+
+def findBestMoveParallel(gs, validMoves, returnQueue, workers, maxDepth=None, timeLimit=TIME_LIMIT, nodeLimit=None, useBook=True):
+    '''
+    findBestMove spread over a pool of worker processes by splitting the root moves. Each iteration searches the previous
+    best move first on its own; its score is the alpha bound for the other root moves, which are dealt out round robin
+    to the workers. Depth 1 is searched in this process so there is always a move. Book moves are played as by findBestMove.
+    Every process searches with its module searcher.
+    Library only: the GUI and uci.py don't use it, and it has no stopEvent or infoCallback. benchmark.py parallel
+    measures it
+    '''
+    global parallelSearchID
+    if workers <= 1:
+        findBestMove(gs, validMoves, returnQueue, maxDepth, timeLimit, nodeLimit, useBook=useBook)
+        return
+    searcher.nodeCount = 0
+    if useBook:
+        bookMove = searcher.openingBook.pickMove(gs, validMoves)
+        if bookMove is not None:
+            returnQueue.put(bookMove)
+            return
+    if maxDepth is None:
+        maxDepth = defaultDepth(gs)
+    pool = getSearchPool(workers)
+    parallelSearchID += 1
+    random.shuffle(validMoves)
+    searcher.startSearch(gs, SearchLimits(maxDepth, timeLimit, nodeLimit))
+    searcher.searchDepth = 1
+    results = searcher.searchRoot(gs, [RootMove(move) for move in validMoves], 1, -CHECKMATE, CHECKMATE, 1)
+    bestMove = results[0][0].move if results else None
+    totalNodes = searcher.nodeCount
+    stopTime = searcher.stopTime
+    for depth in range(2, maxDepth + 1):
+        if bestMove is None or (nodeLimit is not None and totalNodes >= nodeLimit):
+            break
+        validMoves.remove(bestMove)
+        validMoves.insert(0, bestMove)
+        nodesLeft = nodeLimit - totalNodes if nodeLimit is not None else None
+        firstScore, firstMoveID, nodes = pool.apply(searchRootMoves, (gs, [bestMove.moveID], depth, -CHECKMATE, CHECKMATE, stopTime, nodesLeft, parallelSearchID))
+        totalNodes += nodes
+        if firstScore is None:
             break
-    # Cache the result for future use
-    cache[position_key] = maxScore
-    return maxScore
+        otherMoveIDs = [move.moveID for move in validMoves[1:]]
+        chunks = [otherMoveIDs[i::workers] for i in range(workers) if otherMoveIDs[i::workers]]
+        # the chunks run at the same time, so they share what is left of the node budget instead of each getting all of it
+        chunkNodes = None
+        if nodeLimit is not None:
+            if totalNodes >= nodeLimit:
+                break
+            chunkNodes = max((nodeLimit - totalNodes) // max(len(chunks), 1), 1)
+        results = pool.starmap(searchRootMoves, [(gs, chunk, depth, firstScore, CHECKMATE, stopTime, chunkNodes, parallelSearchID) for chunk in chunks], chunksize=1)
+        totalNodes += sum(nodes for score, moveID, nodes in results)
+        if any(score is None for score, moveID, nodes in results):
+            break # a worker ran out of time, the iteration is incomplete
+        bestScore, bestMoveID = firstScore, firstMoveID
+        for score, moveID, nodes in results:
+            if score > bestScore: # only scores above the first move's are exact, lower ones are upper bounds
+                bestScore, bestMoveID = score, moveID
+        bestMove = [move for move in validMoves if move.moveID == bestMoveID][0]
+    searcher.nodeCount = totalNodes
+    returnQueue.put(bestMove)
+
+
+def searchRootMoves(gs, moveIDs, depth, alpha, beta, stopAt, nodeLimit, searchID):
+    '''
+    runs in a pool process: searches the given root moves to depth with the window (alpha, beta) and returns
+    (score, moveID, nodes) of the best one, (None, None, nodes) when the time or node budget ran out
+    '''
+    global workerSearchID
+    if searchID != workerSearchID:
+        searcher.transpositionTable.newSearch()
+        searcher.resetMoveOrdering()
+        workerSearchID = searchID
+    searcher.searchDepth = depth
+    searcher.nodeCount = 0
+    searcher.stopTime = stopAt
+    searcher.maxNodes = nodeLimit
+    searcher.stopSignal = None
+    searcher.rootPly = len(gs.moveLog)
+    turnMultiplier = 1 if gs.whiteToMove else -1
+    bestScore = -CHECKMATE - 1 # below any score, so a move is chosen even if all of them get mated
+    bestMoveID = None
+    # the moves are searched as children of the root rather than through searchRoot, which would read and sort
+    # every root move
+    try:
+        for move in gs.getValidMoves():
+            if move.moveID not in moveIDs:
+                continue
+            gs.makeMove(move)
+            score = -searcher.findMoveNegaMaxAlphaBeta(gs, depth - 1, -beta, -alpha, -turnMultiplier)
+            gs.undoMove()
+            if score > bestScore:
+                bestScore = score
+                bestMoveID = move.moveID
+            if score > alpha:
+                alpha = score
+            if alpha >= beta:
+                break
+    except SearchTimeout:
+        return None, None, searcher.nodeCount
+    return bestScore, bestMoveID, searcher.nodeCount
+
 
 def findRandomMove(validMoves):
-    return random.choice(validMoves)
\ No newline at end of file
+    return random.choice(validMoves)
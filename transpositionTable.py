@@ -0,0 +1,48 @@
+"""
+Fixed size transposition table for the search, indexed by the zobrist key of the position (GameState.zobristKey).
+"""
+
+# bound types stored with a score
+EXACT = 0 # score is the exact value of the position
+LOWERBOUND = 1 # search failed high (beta cutoff), the real score is >= the stored one
+UPPERBOUND = 2 # search failed low, the real score is <= the stored one
+
+
+class TranspositionTable():
+    def __init__(self, sizeBits=18):
+        # 2 ** sizeBits slots, allocated once so memory stays flat however long the game runs
+        self.size = 1 << sizeBits
+        self.mask = self.size - 1
+        self.entries = [None] * self.size # each entry: (key, depth, flag, score, bestMove, generation)
+        self.generation = 0
+
+    def newSearch(self):
+        '''
+        call once per findBestMove, entries from older searches are the first to be replaced
+        '''
+        self.generation += 1
+
+    def clear(self):
+        self.entries = [None] * self.size
+        self.generation = 0
+
+    def probe(self, key):
+        '''
+        returns (depth, flag, score, bestMove) stored for this position or None
+        '''
+        entry = self.entries[key & self.mask]
+        if entry is not None and entry[0] == key:
+            return entry[1], entry[2], entry[3], entry[4]
+        return None
+
+    def store(self, key, depth, flag, score, bestMove):
+        '''
+        replacement policy: an empty slot, the same position, an entry left over from an older search or
+        one searched to a lower or equal depth gets overwritten; deeper entries of the current search are kept
+        '''
+        index = key & self.mask
+        entry = self.entries[index]
+        if entry is None or entry[0] == key or entry[5] != self.generation or depth >= entry[1]:
+            if bestMove is None and entry is not None and entry[0] == key:
+                bestMove = entry[4] # keep the old best move for move ordering if we have none
+            self.entries[index] = (key, depth, flag, score, bestMove, self.generation)
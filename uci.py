@@ -0,0 +1,199 @@
+"""
+Headless UCI (Universal Chess Interface) front end, for chess GUIs, tournament managers and batch matches.
+Register `python uci.py` as a UCI engine. It only reads stdin and writes stdout and does not import pygame.
+Supported: uci, isready, ucinewgame, setoption name OwnBook value true|false, setoption name MultiPV value N, position startpos|fen <fen> [moves ...],
+go [depth N] [movetime MS] [wtime MS] [btime MS] [winc MS] [binc MS] [movestogo N] [nodes N] [infinite], stop, quit
+"""
+import sys
+import threading
+import time
+
+from chessEngine import GameState
+import smartMoveFinder
+
+ENGINE_NAME = "AI-ChessEngine"
+ENGINE_AUTHOR = "theinit01"
+MAX_SEARCH_DEPTH = smartMoveFinder.MAX_PLY - 1 # depth limit when the search is only bounded by time or stop
+DEFAULT_MOVES_TO_GO = 30 # moves the remaining clock time is shared between when the GUI doesn't say
+MOVE_OVERHEAD = 0.05 # seconds kept back on every move for the GUI's communication lag
+MAX_MULTI_PV = 20
+
+
+def allocateTime(timeLeft, increment, movesToGo):
+    '''
+    seconds to think about this move: an equal share of the clock (milliseconds) for the moves to go plus most of the
+    increment, never more than half of what is left
+    '''
+    share = timeLeft / (movesToGo or DEFAULT_MOVES_TO_GO) + increment * 0.8
+    return max(0.01, min(share, timeLeft / 2) / 1000 - MOVE_OVERHEAD)
+
+
+def uciScore(score, pv):
+    '''
+    the score part of an info line: "mate N" (in moves, negative when getting mated) for a mate, found from the length
+    of the principal variation, otherwise "cp N"
+    '''
+    if score >= smartMoveFinder.CHECKMATE:
+        return "mate %d" % ((len(pv) + 1) // 2)
+    if score <= -smartMoveFinder.CHECKMATE:
+        return "mate %d" % -(len(pv) // 2)
+    return "cp %d" % round(score * 100)
+
+
+class UciEngine():
+    def __init__(self, output=sys.stdout):
+        self.output = output
+        self.outputLock = threading.Lock() # info lines come from the search thread
+        self.gs = GameState()
+        self.searchThread = None
+        self.stopEvent = None # set by stop: the search returns its best move so far
+        self.stopped = None # set by stop: an infinite search sends its bestmove only then
+        self.ownBook = True # play moves from the opening book
+        self.multiPV = 1 # lines reported with their own score and pv, the best one is played
+        self.searcher = smartMoveFinder.Searcher()
+
+    def send(self, line):
+        with self.outputLock:
+            self.output.write(line + "\n")
+            self.output.flush()
+
+    def handle(self, line):
+        '''
+        carries out one command line, returns False on quit
+        '''
+        tokens = line.split()
+        if not tokens:
+            return True
+        command = tokens[0]
+        if command == "uci":
+            self.send("id name " + ENGINE_NAME)
+            self.send("id author " + ENGINE_AUTHOR)
+            self.send("option name OwnBook type check default true")
+            self.send("option name MultiPV type spin default 1 min 1 max %d" % MAX_MULTI_PV)
+            self.send("uciok")
+        elif command == "isready":
+            self.send("readyok")
+        elif command == "ucinewgame":
+            self.stopSearch()
+            self.searcher.newGame()
+            self.gs = GameState()
+        elif command == "position":
+            self.stopSearch()
+            self.setPosition(tokens[1:])
+        elif command == "go":
+            self.stopSearch()
+            self.startSearch(tokens[1:])
+        elif command == "setoption":
+            self.setOption(tokens[1:])
+        elif command == "stop":
+            self.stopSearch()
+        elif command == "quit":
+            self.stopSearch()
+            return False
+        # anything else (debug, register, ...) is ignored as the protocol asks
+        return True
+
+    def setOption(self, tokens):
+        # setoption name <name> value <value>, unknown options are ignored
+        if "name" in tokens and "value" in tokens:
+            name = " ".join(tokens[tokens.index("name") + 1:tokens.index("value")])
+            value = " ".join(tokens[tokens.index("value") + 1:])
+            if name.lower() == "ownbook":
+                self.ownBook = value.lower() == "true"
+            elif name.lower() == "multipv" and value.isdigit():
+                self.multiPV = min(max(int(value), 1), MAX_MULTI_PV)
+
+    def setPosition(self, tokens):
+        if "moves" in tokens:
+            moves = tokens[tokens.index("moves") + 1:]
+            tokens = tokens[:tokens.index("moves")]
+        else:
+            moves = []
+        try: # a bad position must not end the engine, the last good one stays
+            if tokens and tokens[0] == "startpos":
+                gs = GameState()
+            elif tokens and tokens[0] == "fen":
+                gs = GameState(" ".join(tokens[1:]))
+            else:
+                raise ValueError("expected startpos or fen")
+            for notation in moves:
+                move = gs.getMoveFromNotation(notation)
+                if move is None:
+                    self.send("info string illegal move %s, ignoring the rest" % notation)
+                    break
+                gs.makeMove(move)
+        except Exception as e:
+            self.send("info string invalid position: %s" % (e or type(e).__name__))
+            return
+        self.gs = gs
+
+    def startSearch(self, tokens):
+        '''
+        parses the go parameters and starts the search in a thread, so stop and isready are still read
+        '''
+        params = {}
+        infinite = "infinite" in tokens
+        for i, token in enumerate(tokens[:-1]):
+            if token in ("depth", "movetime", "wtime", "btime", "winc", "binc", "movestogo", "nodes") and tokens[i + 1].isdigit():
+                params[token] = int(tokens[i + 1])
+        maxDepth = params.get("depth", MAX_SEARCH_DEPTH)
+        timeLimit = None
+        clock = "wtime" if self.gs.whiteToMove else "btime"
+        if "movetime" in params:
+            timeLimit = max(0.01, params["movetime"] / 1000 - MOVE_OVERHEAD)
+        elif clock in params:
+            increment = params.get("winc" if self.gs.whiteToMove else "binc", 0)
+            timeLimit = allocateTime(params[clock], increment, params.get("movestogo"))
+        elif not infinite and "depth" not in params and "nodes" not in params:
+            maxDepth, timeLimit = None, smartMoveFinder.TIME_LIMIT # plain "go": same as the GUI
+        self.stopEvent = threading.Event()
+        self.stopped = threading.Event()
+        self.searchThread = threading.Thread(target=self.search, args=(maxDepth, timeLimit, params.get("nodes"), infinite), daemon=True)
+        self.searchThread.start()
+
+    def search(self, maxDepth, timeLimit, nodeLimit, infinite):
+        gs = self.gs
+        startTime = time.time()
+        multiPV = self.multiPV
+        def sendInfo(depth, rootMoves):
+            seconds = time.time() - startTime
+            nodes = self.searcher.nodeCount
+            for i, rootMove in enumerate(rootMoves[:multiPV]):
+                self.send("info depth %d%s score %s nodes %d nps %d time %d pv %s" % (depth, " multipv %d" % (i + 1) if multiPV > 1 else "",
+                          uciScore(rootMove.score, rootMove.pv), nodes, nodes / max(seconds, 0.001), seconds * 1000,
+                          " ".join(move.getChessNotation() for move in rootMove.pv)))
+        bestMove = None
+        try:
+            bestMove = self.searcher.openingBook.pickMove(gs, gs.getValidMoves()) if self.ownBook else None
+            if bestMove is None:
+                limits = smartMoveFinder.SearchLimits(maxDepth, timeLimit, nodeLimit, self.stopEvent, multiPV)
+                rootMoves = self.searcher.search(gs, limits, sendInfo)
+                bestMove = rootMoves[0].move if rootMoves else None
+        except Exception as e:
+            self.send("info string search failed: %s" % (e or type(e).__name__))
+        finally: # the GUI waits for bestmove whatever happened
+            if infinite:
+                self.stopped.wait() # the protocol wants bestmove only after stop, even if the search is done
+            self.send("bestmove " + (bestMove.getChessNotation() if bestMove is not None else "0000"))
+
+    def stopSearch(self):
+        '''
+        stops a running search, which still sends its bestmove, and waits for it
+        '''
+        if self.searchThread is not None:
+            self.stopEvent.set()
+            self.stopped.set()
+            self.searchThread.join()
+            self.searchThread = None
+
+
+def main():
+    engine = UciEngine()
+    for line in sys.stdin:
+        if not engine.handle(line):
+            break
+    engine.stopSearch()
+
+
+if __name__ == "__main__":
+    main()